@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from tox._cache import clone_tree, dump_json, load_json, sources_fingerprint, statkey
+
+
+def test_statkey(tmpdir):
+    p = tmpdir.join("file")
+    assert statkey(p) is None
+    p.write("hello")
+    key = statkey(p)
+    assert key[1] == 5
+    p.write("hello world")
+    assert statkey(p) != key
+
+
+def test_json_roundtrip(tmpdir):
+    p = tmpdir.join("sub", "cache")
+    assert load_json(p) is None
+    assert load_json(p, {}) == {}
+    dump_json(p, {"a": [1, 2.5, None]})
+    assert load_json(p) == {"a": [1, 2.5, None]}
+    assert tmpdir.join("sub").listdir() == [p]
+    p.write("{broken")
+    assert load_json(p, {}) == {}
+
+
+def test_sources_fingerprint(tmpdir, monkeypatch):
+    tmpdir.ensure("a.py").write("a")
+    tmpdir.ensure("pkg", "b.py").write("b")
+    tmpdir.ensure("other", "c.py").write("c")
+    index = {}
+
+    def ignore(path):
+        return path.basename == "ignored"
+
+    sources = ["a.py", "pkg/b.py"]
+    fp = sources_fingerprint(tmpdir, sources, index, ignore=ignore)
+    assert sorted(index) == ["a.py", "pkg/b.py"]
+    assert sources_fingerprint(tmpdir, sources, {}, ignore=ignore) == fp
+    tmpdir.join("other", "c.py").write("changed")
+    tmpdir.ensure("ignored", "d.py")
+    tmpdir.ensure("pkg", "ignored")
+    assert sources_fingerprint(tmpdir, sources, index, ignore=ignore) == fp
+
+    # unchanged files are not read again
+    import tox._cache
+    monkeypatch.setattr(tox._cache, "file_digest", None)
+    assert sources_fingerprint(tmpdir, sources, index, ignore=ignore) == fp
+    monkeypatch.undo()
+
+    tmpdir.join("pkg", "b.py").write("bb")
+    fp = sources_fingerprint(tmpdir, sources, index, ignore=ignore)
+    tmpdir.ensure("pkg", "new.py")
+    assert sources_fingerprint(tmpdir, sources, index, ignore=ignore) != fp
+    tmpdir.join("pkg", "b.py").remove()
+    sources_fingerprint(tmpdir, sources, index, ignore=ignore)
+    assert sorted(index) == ["a.py"]
+
+
+@pytest.mark.skipif("sys.platform == 'win32'")
+def test_clone_tree(tmpdir):
+    src = tmpdir.join("src")
+    src.ensure("bin", "script").write("#!%s/bin/python\n" % src)
+    src.ensure("lib", "mod.py").write("mod")
+    src.ensure("lib", "skip.py")
+    src.join("local").mksymlinkto(src.join("lib"))
+    dst = tmpdir.join("dst")
+
+    def relocate(relpath):
+        return relpath.startswith("bin" + os.sep)
+
+    clone_tree(src, dst, origin=src, relocate=relocate,
+               ignore=lambda relpath: relpath.endswith("skip.py"))
+    assert dst.join("bin", "script").read() == "#!%s/bin/python\n" % dst
+    assert dst.join("lib", "mod.py").read() == "mod"
+    assert dst.join("lib", "mod.py").stat().nlink == 2
+    assert not dst.join("lib", "skip.py").check()
+    assert dst.join("local").readlink() == str(dst.join("lib"))
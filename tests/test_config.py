@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 from textwrap import dedent
 
 import py
@@ -8,7 +9,7 @@ import tox
 import tox.config
 from tox.config import (
     SectionReader, is_section_substitution, CommandParser,
-    parseconfig, DepOption, get_homedir, getcontextname,
+    parseconfig, DepOption, get_homedir, getcontextname, PARALLEL_ENV_VAR,
 )
 from tox.venv import VirtualEnv
 
@@ -1425,6 +1426,34 @@ class TestConfigTestEnv:
         config = newconfig([], inisource).envconfigs
         assert config["python"].ignore_outcome is True
 
+    def test_depends(self, newconfig):
+        inisource = """
+            [tox]
+            envlist = py{27,35}, coverage
+            [testenv:coverage]
+            depends =
+                py{27,35}
+                docs
+        """
+        configs = newconfig([], inisource).envconfigs
+        assert configs["coverage"].depends == ["py27", "py35", "docs"]
+        assert configs["py27"].depends == []
+
+    def test_depends_cycle(self, newconfig):
+        inisource = """
+            [tox]
+            envlist = a, b, c
+            [testenv:a]
+            depends = c
+            [testenv:b]
+            depends = a
+            [testenv:c]
+            depends = b
+        """
+        with py.test.raises(tox.exception.ConfigError) as excinfo:
+            newconfig([], inisource)
+        assert "a -> c -> b -> a" in str(excinfo.value)
+
 
 class TestGlobalOptions:
     def test_notest(self, newconfig):
@@ -1567,6 +1596,138 @@ class TestGlobalOptions:
         with py.test.raises(tox.exception.MinVersionError):
             newconfig([], inisource)
 
+    def test_wheel(self, newconfig):
+        config = newconfig([], "")
+        assert not config.wheel
+        assert config.wheeldir == config.toxworkdir.join("wheel")
+        config = newconfig(["--wheel"], "")
+        assert config.wheel
+        config = newconfig([], """
+            [tox]
+            wheel = True
+        """)
+        assert config.wheel
+
+    def test_wheelhouse(self, newconfig):
+        config = newconfig([], "")
+        assert not config.wheelhouse
+        assert config.wheelhousedir == config.toxworkdir.join("wheelhouse")
+        config = newconfig(["--wheelhouse"], "")
+        assert config.wheelhouse
+        config = newconfig([], """
+            [tox]
+            wheelhouse = True
+        """)
+        assert config.wheelhouse
+
+    def test_batchinstall(self, newconfig):
+        config = newconfig([], "")
+        assert not config.batchinstall
+        config = newconfig(["--batchinstall"], "")
+        assert config.batchinstall
+        config = newconfig([], """
+            [tox]
+            batchinstall = True
+        """)
+        assert config.batchinstall
+
+    def test_lockdeps(self, newconfig):
+        config = newconfig([], "")
+        assert not config.lockdeps
+        assert not config.envconfigs["python"].recreate
+        config = newconfig(["--lockdeps"], "")
+        assert config.lockdeps
+        config = newconfig(["--relock"], "")
+        assert config.lockdeps
+        assert config.envconfigs["python"].recreate
+        config = newconfig([], """
+            [tox]
+            lockdeps = True
+        """)
+        assert config.lockdeps
+
+    def test_scaninstalled(self, newconfig):
+        config = newconfig([], "")
+        assert not config.scaninstalled
+        config = newconfig(["--scaninstalled"], "")
+        assert config.scaninstalled
+        config = newconfig([], """
+            [tox]
+            scaninstalled = True
+        """)
+        assert config.scaninstalled
+
+    def test_envtemplates(self, newconfig):
+        config = newconfig([], "")
+        assert not config.envtemplates
+        config = newconfig(["--envtemplates"], "")
+        assert config.envtemplates
+        config = newconfig([], """
+            [tox]
+            envtemplates = True
+        """)
+        assert config.envtemplates
+
+    def test_recordhistory(self, newconfig):
+        config = newconfig([], "")
+        assert not config.recordhistory
+        assert config.historypath == config.toxworkdir.join(".history.sqlite")
+        assert config.option.history is None
+        config = newconfig(["--record-history"], "")
+        assert config.recordhistory
+        config = newconfig([], """
+            [tox]
+            recordhistory = True
+        """)
+        assert config.recordhistory
+        assert newconfig(["--history"], "").option.history == 10
+        assert newconfig(["--history", "3"], "").option.history == 3
+        for value in ("0", "-1", "many"):
+            with pytest.raises(SystemExit):
+                newconfig(["--history", value], "")
+
+    def test_outputlimit(self, newconfig):
+        config = newconfig([], "")
+        assert config.outputlimit == 65536
+        config = newconfig(["--output-limit", "0"], "")
+        assert config.outputlimit == 0
+        config = newconfig([], """
+            [tox]
+            outputlimit = 1000
+        """)
+        assert config.outputlimit == 1000
+        with pytest.raises(tox.exception.ConfigError):
+            newconfig([], """
+                [tox]
+                outputlimit = much
+            """)
+
+    def test_parallel(self, newconfig, monkeypatch):
+        config = newconfig([], "")
+        assert config.parallel == 0
+        config = newconfig(["--parallel", "3"], "")
+        assert config.parallel == 3
+        monkeypatch.setattr(multiprocessing, "cpu_count", lambda: 5)
+        config = newconfig(["--parallel"], "")
+        assert config.parallel == 5
+        config = newconfig(["--parallel", "auto"], "")
+        assert config.parallel == 5
+        with pytest.raises(SystemExit):
+            newconfig(["--parallel", "0"], "")
+
+    def test_parallel_worker(self, newconfig, monkeypatch):
+        monkeypatch.setenv(PARALLEL_ENV_VAR, "py27")
+        config = newconfig(["--parallel", "3", "-epy26,py27"], """
+            [tox]
+            envlist = py26,py27
+        """)
+        assert config.parallel == 0
+        assert config.parallel_env == "py27"
+        assert config.envlist == ["py27"]
+        assert config.skipsdist
+        assert "--parallel" in config.args
+        assert PARALLEL_ENV_VAR not in os.environ
+
     def test_skip_missing_interpreters_true(self, tmpdir, newconfig, monkeypatch):
         inisource = """
             [tox]
@@ -0,0 +1,40 @@
+from tox._history import HistoryRecorder, percentile, summarize
+
+
+def test_percentile():
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.0
+    assert percentile(range(1, 101), 95) == 95
+
+
+def record(path, runtests, retcode=0):
+    recorder = HistoryRecorder(path)
+    recorder.write({"event": "header"})
+    recorder.write({"event": "action", "env": "py36", "msg": "getenv",
+                    "duration": 0.5})
+    recorder.write({"event": "action", "env": "py36", "msg": "runtests",
+                    "duration": runtests})
+    recorder.write({"event": "command", "env": "py36", "command": {
+        "command": ["py.test", "-x"], "retcode": str(retcode),
+        "duration": runtests - 0.1}})
+    recorder.write({"event": "testenv", "env": "py27", "testenv": {
+        "setup": [], "test": [{"command": ["nosetests"], "retcode": "0",
+                               "duration": 0.2}]}})
+    recorder.write({"event": "action", "env": "py27", "msg": "parallel",
+                    "duration": 1.0})
+    recorder.write({"event": "finish", "retcode": retcode})
+
+
+def test_record_and_summarize(tmpdir):
+    path = tmpdir.join("work", ".history.sqlite")
+    assert summarize(path, 10) == (0, [], [])
+    for runtests in (1.0, 2.0, 3.0, 9.0):
+        record(path, runtests, retcode=int(runtests > 5))
+    runs, envs, commands = summarize(path, 3, slowest=2)
+    assert runs == 3
+    assert envs == [("py27", 1.0, 1.0), ("py36", 3.5, 9.5)]
+    assert commands == [(8.9, "py36", "py.test -x", 1),
+                        (2.9, "py36", "py.test -x", 0)]
+    runs, envs, commands = summarize(path, 10)
+    assert runs == 4
+    assert len(commands) == 8
@@ -76,6 +76,8 @@ def test_run_and_get_interpreter_info():
     assert info.version_info == tuple(sys.version_info)
     assert info.name == name
     assert info.executable == sys.executable
+    assert info.version == sys.version
+    assert info.sysplatform == sys.platform
 
 
 class TestInterpreters:
@@ -103,6 +105,24 @@ class TestInterpreters:
         assert not info.executable
         assert not info.runnable
 
+    def test_discover(self, interpreters):
+        class envconfig1:
+            basepython = sys.executable
+            envname = "py1"
+
+        class envconfig2(envconfig1):
+            envname = "py2"
+
+        class envconfig3:
+            basepython = "1lkj23"
+            envname = "py3"
+        interpreters.discover([envconfig1, envconfig2, envconfig3])
+        assert interpreters.name2executable["py1"] == sys.executable
+        assert interpreters.name2executable["py2"] == sys.executable
+        assert interpreters.name2executable["py3"] is None
+        info = interpreters.executable2info[interpreters.name2executable["py1"]]
+        assert info.version_info == tuple(sys.version_info)
+
     def test_get_sitepackagesdir_error(self, interpreters):
         class envconfig:
             basepython = sys.executable
@@ -110,3 +130,57 @@ class TestInterpreters:
         info = interpreters.get_info(envconfig)
         s = interpreters.get_sitepackagesdir(info, "")
         assert s
+
+    def test_get_sitepackagesdir(self, interpreters, tmpdir):
+        class envconfig:
+            basepython = sys.executable
+            envname = "123"
+        info = interpreters.get_info(envconfig)
+        assert info.sitepackages.startswith(ENVDIR_MARKER)
+        expected = exec_on_interpreter(sys.executable, [
+            inspect.getsource(sitepackagesdir),
+            "print(sitepackagesdir(%r))" % str(tmpdir)])["dir"]
+        assert interpreters.get_sitepackagesdir(info, tmpdir) == expected
+
+    def test_info_cache(self, interpreters, tmpdir, monkeypatch):
+        class envconfig:
+            basepython = sys.executable
+            envname = "pyxx"
+        interpreters.cachepath = tmpdir.join("cache")
+        info = interpreters.get_info(envconfig)
+        assert interpreters.cachepath.check()
+
+        def run_and_get_interpreter_info(name, executable):
+            raise AssertionError("interpreter should not be run")
+
+        import tox.interpreters
+        monkeypatch.setattr(tox.interpreters, "run_and_get_interpreter_info",
+                            run_and_get_interpreter_info)
+        cached = Interpreters(hook=interpreters.hook)
+        cached.cachepath = interpreters.cachepath
+        cachedinfo = cached.get_info(envconfig)
+        assert cachedinfo.version_info == info.version_info
+        assert cachedinfo.sysplatform == info.sysplatform
+        assert cachedinfo.executable == info.executable
+
+        # a changed interpreter binary invalidates the cache entry
+        monkeypatch.setattr(tox.interpreters, "statkey", lambda path: [0, 0, 0])
+        cached = Interpreters(hook=interpreters.hook)
+        cached.cachepath = interpreters.cachepath
+        with pytest.raises(AssertionError):
+            cached.get_info(envconfig)
+
+    def test_info_cache_skips_scripts(self, interpreters, tmpdir):
+        script = tmpdir.join("python")
+        script.write("#!/bin/sh\nexec %s \"$@\"\n" % sys.executable)
+        script.chmod(0o755)
+
+        class envconfig:
+            basepython = str(script)
+            envname = "pyxx"
+        interpreters.cachepath = tmpdir.join("cache")
+        assert is_script(script)
+        assert not is_script(sys.executable)
+        if sys.platform != "win32":
+            assert interpreters.get_info(envconfig).runnable
+            assert not interpreters.cachepath.check()
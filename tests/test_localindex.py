@@ -0,0 +1,39 @@
+import py
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+from tox._localindex import LocalIndex, normalize_name, project_name
+
+
+def test_project_name():
+    assert normalize_name("Foo_Bar.baz") == "foo-bar-baz"
+    assert project_name("Foo_Bar-1.0.zip") == "foo-bar"
+    assert project_name("foo-bar-1.0.dev1.tar.gz") == "foo-bar"
+    assert project_name("foo.bar-2.0-py2.py3-none-any.whl") == "foo-bar"
+    assert project_name("README.txt") is None
+
+
+def test_local_index(tmpdir):
+    tmpdir.ensure("a", "Foo_Bar-1.0.zip").write("sdist")
+    tmpdir.ensure("b", "foo.bar-2.0-py2.py3-none-any.whl").write("wheel")
+    tmpdir.ensure("b", "other.txt")
+    index = LocalIndex([tmpdir.join("a"), tmpdir.join("b"), tmpdir.join("missing")])
+    assert index.projects() == {"foo-bar": [(0, "Foo_Bar-1.0.zip"),
+                                            (1, "foo.bar-2.0-py2.py3-none-any.whl")]}
+    index.start()
+    try:
+        assert index.url.startswith("http://127.0.0.1:")
+        page = urlopen(index.url).read().decode("utf-8")
+        assert '<a href="foo-bar/">foo-bar</a>' in page
+        page = urlopen(index.url + "Foo.Bar/").read().decode("utf-8")
+        assert '<a href="/files/1/foo.bar-2.0-py2.py3-none-any.whl">' in page
+        url = index.url.replace("/simple/", "/files/0/Foo_Bar-1.0.zip")
+        assert urlopen(url).read() == b"sdist"
+        for path in ("/simple/nope/", "/files/0/other.txt", "/files/5/Foo_Bar-1.0.zip"):
+            with py.test.raises(Exception):
+                urlopen(index.url.replace("/simple/", path))
+    finally:
+        index.stop()
@@ -1,6 +1,7 @@
+import json
 import sys
 import py
-from tox.result import ResultLog
+from tox.result import JsonLinesWriter, ResultLog
 import tox
 import pytest
 
@@ -53,6 +54,18 @@ def test_addenv_setpython(pkg):
     assert envlog.dict["python"]["executable"] == sys.executable
 
 
+def test_addenv_setpython_from_info(pkg, monkeypatch):
+    from tox.interpreters import run_and_get_interpreter_info
+    info = run_and_get_interpreter_info("python", sys.executable)
+    monkeypatch.setattr(py.path.local, "sysexec", None)
+    replog = ResultLog()
+    envlog = replog.get_envlog("py26")
+    envlog.set_python_info("/path/to/env/bin/python", info=info)
+    assert envlog.dict["python"]["version_info"] == list(sys.version_info)
+    assert envlog.dict["python"]["version"] == sys.version
+    assert envlog.dict["python"]["executable"] == "/path/to/env/bin/python"
+
+
 def test_get_commandlog(pkg):
     replog = ResultLog()
     replog.set_header(installpkg=pkg)
@@ -66,3 +79,55 @@ def test_get_commandlog(pkg):
     assert envlog.dict["setup"]
     setuplog2 = replog.get_envlog("py26").get_commandlog("setup")
     assert setuplog2.list == setuplog.list
+    outputfile = dict(path="/log/1.log", size=12, sha256="abc")
+    d = setuplog.add_command(["pip", "install"], "...", 0, outputfile)
+    assert d["outputfile"] == outputfile
+
+
+def test_set_status(pkg):
+    replog = ResultLog()
+    envlog = replog.get_envlog("py26")
+    envlog.set_status("commands failed")
+    assert envlog.get_status() == "commands failed"
+    envlog = replog.get_envlog("py27")
+    envlog.set_status(tox.exception.InterpreterNotFound("python2.7"))
+    replog2 = ResultLog.loads_json(replog.dumps_json())
+    status = replog2.get_envlog("py27").get_status()
+    assert isinstance(status, tox.exception.InterpreterNotFound)
+    assert str(status) == "InterpreterNotFound: python2.7"
+
+
+def test_set_installed():
+    envlog = ResultLog().get_envlog("py36")
+    envlog.set_installed(["abc==1.0", "-e git+https://example.org/x#egg=x"])
+    assert envlog.dict["installed_packages"][1].startswith("-e ")
+    assert "installed_versions" not in envlog.dict
+    envlog.set_installed([("abc", "1.0"), ("xyz", "2.0")])
+    assert envlog.dict["installed_packages"] == ["abc==1.0", "xyz==2.0"]
+    assert envlog.dict["installed_versions"] == {"abc": "1.0", "xyz": "2.0"}
+
+
+def test_jsonl_stream(pkg, tmpdir):
+    path = tmpdir.join("result.jsonl")
+    replog = ResultLog()
+    writer = JsonLinesWriter(path)
+    replog.add_stream(writer)
+    replog.set_header(installpkg=pkg)
+    envlog = replog.get_envlog("py36")
+    envlog.set_python_info(sys.executable)
+    envlog.get_commandlog("setup").add_command(["virtualenv"], "created", 0)
+    replog.emit("action", env="py36", msg="runtests", duration=1.5)
+    envlog.get_commandlog("test").add_command(["py.test"], "failed", 1)
+    envlog.set_installed([("abc", "1.0")])
+    envlog.set_status(tox.exception.InterpreterNotFound("python3.6"))
+    # every event is on disk right away
+    events = [json.loads(line) for line in path.read().splitlines()]
+    assert [x["event"] for x in events] == [
+        "header", "installpkg", "python", "command", "action", "command",
+        "installed", "status"]
+    assert events[3]["env"] == "py36" and events[3]["log"] == "setup"
+    writer.close()
+    replog2 = ResultLog.loads_jsonl(path.read())
+    assert replog2.dict == json.loads(replog.dumps_json())
+    status = replog2.get_envlog("py36").get_status()
+    assert isinstance(status, tox.exception.InterpreterNotFound)
@@ -23,6 +23,28 @@ def test_getdigest(tmpdir):
     assert getdigest(tmpdir) == "0" * 32
 
 
+def test_getdepname():
+    assert getdepname("pytest") == "pytest"
+    assert getdepname("Foo_Bar[x,y] >=1.0, <2") == "foo-bar"
+    assert getdepname("six; python_version < '3'") == "six"
+    assert getdepname("-rrequirements.txt") is None
+    assert getdepname("/path/to/pkg.zip") is None
+
+
+def test_getdigest_cached(tmpdir, monkeypatch):
+    cachepath = tmpdir.join(".digests")
+    path = tmpdir.join("python")
+    path.write("hello")
+    digest = getdigest(path, cachepath)
+    assert digest == path.computehash()
+    assert cachepath.check()
+    monkeypatch.setattr(py.path.local, "computehash", None)
+    assert getdigest(path, cachepath) == digest
+    monkeypatch.undo()
+    path.write("hello world")
+    assert getdigest(path, cachepath) == path.computehash() != digest
+
+
 def test_getsupportedinterpreter(monkeypatch, newconfig, mocksession):
     config = newconfig([], """
         [testenv:python]
@@ -178,6 +200,102 @@ def test_install_deps_indexserver(newmocksession):
     assert "dep3" in args
 
 
+def test_install_deps_lock(newmocksession, monkeypatch):
+    mocksession = newmocksession(["--lockdeps"], """
+        [testenv:py123]
+        deps=abc
+    """)
+    venv = mocksession.getenv('py123')
+    lockfile = venv.envconfig.lockfile
+    assert lockfile == mocksession.config.toxinidir.join("tox-py123.lock")
+    monkeypatch.setattr(venv, "listinstalled",
+                        lambda action: ["abc==1.0", "dep==2.0", ""])
+    action = mocksession.newaction(venv, "getenv")
+    tox_testenv_install_deps(action=action, venv=venv)
+    assert lockfile.read().splitlines()[1:] == ["abc==1.0", "dep==2.0"]
+    l = mocksession._pcalls
+    assert len(l) == 1
+    assert l[0].args[-1] == "abc"
+    l[:] = []
+
+    tox_testenv_install_deps(action=action, venv=venv)
+    assert len(l) == 1
+    assert "--no-deps" in l[0].args
+    assert l[0].args[-2:] == ["abc==1.0", "dep==2.0"]
+
+    lockfile.write(lockfile.readlines(cr=0)[0] + "\n"
+                   "abc==1.0\n"
+                   "dep @ file:///tmp/dep-2.0.tar.gz\n"
+                   "-e git+https://example.org/x.git@abc#egg=x\n")
+    assert venv.readlock() == ["abc==1.0", "dep @ file:///tmp/dep-2.0.tar.gz",
+                               "-e", "git+https://example.org/x.git@abc#egg=x"]
+
+    # the lock is ignored once the deps change
+    venv.envconfig.deps = [DepConfig("xyz")]
+    assert venv.readlock() is None
+
+
+def test_listinstalled_cached(newmocksession, monkeypatch):
+    mocksession = newmocksession([], "")
+    venv = mocksession.getenv('python')
+    sitepackages = venv.path.ensure("site", dir=1)
+    monkeypatch.setattr(venv.envconfig, "get_envsitepackagesdir",
+                        lambda: str(sitepackages))
+    action = mocksession.newaction(venv, "envreport")
+    l = mocksession._pcalls
+    assert venv.listinstalled(action) == [""]
+    assert len(l) == 1
+    assert venv.listinstalled(action) == [""]
+    assert len(l) == 1
+    venv.run_install_command(["xyz"], action=action)
+    assert not venv.path_installed.check()
+    venv.listinstalled(action)
+    assert len(l) == 3
+    sitepackages.ensure("new.py")
+    venv.listinstalled(action)
+    assert len(l) == 4
+
+
+def test_scan_installed(tmpdir):
+    site = tmpdir.join("site-packages")
+    assert scan_installed(str(site)) == []
+    site.ensure("Foo_Bar-1.0.dist-info", "METADATA").write(
+        "Metadata-Version: 2.0\nName: Foo-Bar\nVersion: 1.0\n\nVersion: 9\n")
+    site.ensure("pip-9.0.dist-info", "METADATA").write("Name: pip\nVersion: 9.0\n")
+    site.ensure("old-2.0-py2.7.egg-info").write("Name: old\nVersion: 2.0\n")
+    site.ensure("dir.egg-info", "PKG-INFO").write("Name: dir\nVersion: 3.0\n")
+    checkout = tmpdir.ensure("checkout", dir=1)
+    checkout.ensure("dev.egg-info", "PKG-INFO").write("Name: dev\nVersion: 0.1\n")
+    site.join("dev.egg-link").write("%s\n.\n" % checkout)
+    site.ensure("broken.dist-info", dir=1)
+    site.ensure("module.py")
+    assert scan_installed(str(site)) == [
+        ("dev", "0.1"), ("dir", "3.0"), ("Foo-Bar", "1.0"), ("old", "2.0")]
+
+
+def test_install_deps_indexserver_batch(newmocksession):
+    mocksession = newmocksession(["--batchinstall"], """
+        [tox]
+        indexserver =
+            abc = ABC
+            abc2 = ABC2
+        [testenv:py123]
+        deps=
+            :abc:dep2
+            dep1
+            :abc2:dep3
+    """)
+    venv = mocksession.getenv('py123')
+    action = mocksession.newaction(venv, "getenv")
+    tox_testenv_install_deps(action=action, venv=venv)
+    l = mocksession._pcalls
+    assert len(l) == 1
+    args = " ".join(l[0].args)
+    assert "-i " not in args
+    assert "--extra-index-url ABC --extra-index-url ABC2" in args
+    assert args.endswith("dep2 dep1 dep3")
+
+
 def test_install_deps_pre(newmocksession):
     mocksession = newmocksession([], """
         [testenv]
@@ -231,6 +349,32 @@ def test_install_recreate(newmocksession, tmpdir):
     mocksession.report.expect("verbosity0", "*recreate*")
 
 
+def test_envtemplates(newmocksession):
+    mocksession = newmocksession(['--envtemplates'], """
+        [testenv]
+        basepython=%s
+        deps=xyz
+        [testenv:one]
+        [testenv:two]
+    """ % sys.executable)
+    venv = mocksession.getenv('one')
+    action = mocksession.newaction(venv, "update")
+    tox_testenv_create(action=action, venv=venv)
+    venv.envconfig.envbindir.ensure("script").write("#!%s\n" % venv.path)
+    venv.path.ensure("lib", "mod.py").write("mod")
+    tox_testenv_install_deps(action=action, venv=venv)
+    assert len(mocksession._pcalls) == 2
+    mocksession._clearmocks()
+
+    venv = mocksession.getenv('two')
+    action = mocksession.newaction(venv, "update")
+    tox_testenv_create(action=action, venv=venv)
+    tox_testenv_install_deps(action=action, venv=venv)
+    assert not mocksession._pcalls
+    assert venv.envconfig.envbindir.join("script").read() == "#!%s\n" % venv.path
+    assert venv.path.join("lib", "mod.py").read() == "mod"
+
+
 def test_install_sdist_extras(newmocksession):
     mocksession = newmocksession([], """
         [testenv]
@@ -266,6 +410,21 @@ def test_develop_extras(newmocksession, tmpdir):
     assert expected in l[-1].args
 
 
+def test_needs_reinstall_name_cached(tmpdir, mocksession, newconfig):
+    setup_py = tmpdir.ensure("setup.py")
+    config = newconfig([], "")
+    venv = VirtualEnv(config.envconfigs['python'], session=mocksession)
+    action = mocksession.newaction(venv, "hello")
+    l = mocksession._pcalls
+    venv._needs_reinstall(tmpdir, action)
+    assert len(l) == 1
+    venv._needs_reinstall(tmpdir, action)
+    assert len(l) == 1
+    setup_py.write("# changed")
+    venv._needs_reinstall(tmpdir, action)
+    assert len(l) == 2
+
+
 def test_env_variables_added_to_needs_reinstall(tmpdir, mocksession, newconfig, monkeypatch):
     tmpdir.ensure("setup.py")
     monkeypatch.setenv("TEMP_PASS_VAR", "123")
@@ -500,6 +659,23 @@ class TestCreationConfig:
         venv.update(action)
         mocksession.report.expect("verbosity0", "*recreate*")
 
+    def test_reuse_with_deps(self, newmocksession):
+        mocksession = newmocksession([], """
+            [testenv]
+            deps=abc
+                 xyz
+        """)
+        venv = mocksession.getenv("python")
+        cconfig = venv._getliveconfig()
+        cconfig.writeconfig(venv.path_config)
+        assert CreationConfig.readconfig(venv.path_config).md5 == cconfig.md5
+        for i in range(2):
+            mocksession._clearmocks()
+            action = mocksession.newaction(venv, "update")
+            venv.update(action)
+            mocksession.report.expect("*", "*reusing*")
+            assert not mocksession._pcalls
+
     def test_dep_recreation(self, newconfig, mocksession):
         config = newconfig([], "")
         envconfig = config.envconfigs['python']
@@ -514,6 +690,38 @@ class TestCreationConfig:
         venv.update(action)
         mocksession.report.expect("*", "*recreate*")
 
+    def test_dep_update(self, newmocksession):
+        mocksession = newmocksession([], """
+            [testenv]
+            deps=abc
+                 pinned==2.0
+                 new
+        """)
+        venv = mocksession.getenv("python")
+        action = mocksession.newaction(venv, "update")
+        venv.update(action)
+        cconfig = venv._getliveconfig()
+        cconfig.deps[:] = [("0" * 32, "abc"), ("0" * 32, "pinned==1.0")]
+        cconfig.writeconfig(venv.path_config)
+        mocksession._clearmocks()
+        action = mocksession.newaction(venv, "update")
+        assert not venv.update(action)
+        mocksession.report.expect("*", "*updatedeps*")
+        l = mocksession._pcalls
+        assert len(l) == 1
+        assert l[0].args[-2:] == ["pinned==2.0", "new"]
+        assert CreationConfig.readconfig(venv.path_config).matches(
+            venv._getliveconfig())
+
+        # a removed dependency may have pulled in what others still need
+        cconfig = venv._getliveconfig()
+        cconfig.deps.append(("0" * 32, "Gone_Pkg[extra]>=1"))
+        cconfig.writeconfig(venv.path_config)
+        mocksession._clearmocks()
+        action = mocksession.newaction(venv, "update")
+        venv.update(action)
+        mocksession.report.expect("*", "*recreate*")
+
     def test_develop_recreation(self, newconfig, mocksession):
         config = newconfig([], "")
         envconfig = config.envconfigs['python']
@@ -664,6 +872,33 @@ def test_installpkg_upgrade(newmocksession, tmpdir):
     assert '--no-deps' in l[0].args[:index]
 
 
+def test_installpkg_unchanged(newmocksession, tmpdir):
+    pkg = tmpdir.ensure("package.tar.gz")
+    pkg.write("content")
+    mocksession = newmocksession([], "")
+    venv = mocksession.getenv('python')
+    mocksession.installpkg(venv, pkg)
+    l = mocksession._pcalls
+    assert len(l) == 1
+    mocksession.installpkg(venv, pkg)
+    assert len(l) == 1
+    mocksession.report.expect("verbosity0", "*inst-noop*")
+    pkg.write("changed")
+    mocksession.installpkg(venv, pkg)
+    assert len(l) == 2
+
+
+def test_installpkg_upgrade_wheel(newmocksession, tmpdir):
+    pkg = tmpdir.ensure("package-1.0-py2.py3-none-any.whl")
+    mocksession = newmocksession([], "")
+    venv = mocksession.getenv('python')
+    mocksession.installpkg(venv, pkg)
+    l = mocksession._pcalls
+    assert len(l) == 1
+    index = l[0].args.index(str(pkg))
+    assert '--force-reinstall' in l[0].args[:index]
+
+
 def test_run_install_command(newmocksession):
     mocksession = newmocksession([], "")
     venv = mocksession.getenv('python')
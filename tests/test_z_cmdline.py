@@ -1,6 +1,7 @@
 import tox
 import py
 import pytest
+import sys
 from tox._pytestplugin import ReportExpectMock
 try:
     import json
@@ -11,6 +12,8 @@ pytest_plugins = "pytester"
 
 from tox.session import Session
 from tox.config import parseconfig
+from tox.result import ResultLog
+from tox._cache import file_digest
 
 
 def test_report_protocol(newconfig):
@@ -96,6 +99,59 @@ class TestSession:
         assert sdist_new == sdist
         assert sdist_new.stat().size > 10
 
+    def test_discover_interpreters(self, newconfig):
+        config = newconfig([], """
+            [tox]
+            envlist = one, two
+            [testenv]
+            basepython = %s
+        """ % sys.executable)
+        Session(config)
+        assert sorted(config.interpreters.name2executable) == ["one", "two"]
+        assert len(config.interpreters.executable2info) == 1
+        config = newconfig(["-l"], """
+            [tox]
+            envlist = one
+        """)
+        Session(config)
+        assert not config.interpreters.name2executable
+
+    def test_make_sdist_reuse(self, initproj):
+        initproj("example123-0.5", filedefs={
+            'tests': {'test_hello.py': "def test_hello(): pass"},
+            'tox.ini': '''
+            '''
+        })
+        config = parseconfig([])
+        session = Session(config)
+        sdist = session.get_installpkg_path()
+        assert session._actions[-1].activity == "sdist-make"
+        mtime = sdist.mtime()
+        session = Session(config)
+        assert session.get_installpkg_path() == sdist
+        assert session._actions[-1].activity == "sdist-reuse"
+        assert sdist.mtime() == mtime
+        for name in (".coverage", ".pytest_cache/v/x", "htmlcov/index.html",
+                     "venv/pyvenv.cfg", "tests/__pycache__/x.pyc"):
+            py.path.local().ensure(name)
+        session = Session(config)
+        assert session.get_installpkg_path() == sdist
+        assert session._actions[-1].activity == "sdist-reuse"
+        py.path.local("tests").join("test_hello.py").write("def test_hello(): 1")
+        session = Session(config)
+        assert session.get_installpkg_path() == sdist
+        assert session._actions[-1].activity == "sdist-make"
+        session = Session(config)
+        assert session._makesdist() == sdist
+        assert session._actions[-1].activity == "sdist-reuse"
+        py.path.local("tests").join("test_new.py").write("def test_new(): pass")
+        session = Session(config)
+        assert session.get_installpkg_path() == sdist
+        assert session._actions[-1].activity == "sdist-make"
+        session = Session(parseconfig(["--force-sdist"]))
+        assert session.get_installpkg_path() == sdist
+        assert session._actions[-1].activity == "sdist-make"
+
     def test_make_sdist_distshare(self, tmpdir, initproj):
         distshare = tmpdir.join("distshare")
         initproj("example123-0.6", filedefs={
@@ -115,6 +171,230 @@ class TestSession:
         assert sdist_share.check()
         assert sdist_share.read("rb") == sdist.read("rb"), (sdist_share, sdist)
 
+    def test_develop_waits_for_packaging(self, newmocksession, monkeypatch):
+        from tox.session import BackgroundCall
+        mocksession = newmocksession([], """
+            [testenv:dev]
+            usedevelop=True
+            [testenv:nodev]
+            skip_install=True
+        """)
+        dev, nodev = mocksession.getenv("dev"), mocksession.getenv("nodev")
+        assert not mocksession.waits_for_packaging(dev)
+        calls = []
+
+        def sdist():
+            py.std.time.sleep(0.2)
+            calls.append("sdist")
+            return mocksession.config.distdir.join("pkg123-0.7.zip")
+        monkeypatch.setattr(dev, "developpkg",
+                            lambda setupdir, action: calls.append("develop"))
+        mocksession._packaging = BackgroundCall(sdist)
+        mocksession._packaging.start()
+        assert mocksession.waits_for_packaging(dev)
+        assert not mocksession.waits_for_packaging(nodev)
+        mocksession.venvlist = [dev, nodev]
+        pending = [dev, nodev]
+        assert mocksession._popready(pending, set(), installpkg=False) is nodev
+        assert mocksession._popready(pending, set(), installpkg=False) is None
+        assert mocksession.developpkg(dev, mocksession.config.setupdir)
+        assert calls == ["sdist", "develop"]
+
+    def test_wheel_compatible(self, newmocksession, tmpdir, monkeypatch):
+        mocksession = newmocksession([], "")
+        venv = mocksession.getenv("python")
+        major, minor = sys.version_info[:2]
+        sdist = tmpdir.join("pkg-1.0.zip")
+        for basename, compatible in [
+                ("pkg-1.0-py2.py3-none-any.whl", True),
+                ("pkg-1.0-py%d%d-none-any.whl" % (major, minor), True),
+                ("pkg-1.0-py%d-none-any.whl" % (5 - major), False),
+                ("pkg-1.0-1-cp99-cp99m-linux_x86_64.whl", True)]:
+            mocksession.wheelpath = tmpdir.join(basename)
+            assert mocksession.wheel_compatible(venv, mocksession.wheelpath) == compatible
+            expected = mocksession.wheelpath if compatible else sdist
+            assert mocksession.installpkg_for(venv, sdist) == expected
+        # compiled wheels only fit the interpreter which built them
+        venv.envconfig.python_info  # look up the interpreter first
+        monkeypatch.setattr(sys, "executable", str(tmpdir.join("other")))
+        assert not mocksession.wheel_compatible(venv, mocksession.wheelpath)
+
+    def test_wheelhouse(self, newmocksession, monkeypatch):
+        mocksession = newmocksession(["--wheelhouse"], """
+            [testenv]
+            basepython=%s
+            deps=abc==1.0
+            [testenv:one]
+            [testenv:two]
+            deps=abc==1.0
+                 xyz
+        """ % sys.executable)
+        mocksession.venvlist = [mocksession.getenv("one"), mocksession.getenv("two")]
+        for venv in mocksession.venvlist:
+            assert mocksession.wheelhouseopts(venv) is None
+        mocksession.buildwheelhouse()
+        l = mocksession._pcalls
+        assert len(l) == 1
+        assert l[0].args[1:4] == ["-m", "pip", "wheel"]
+        assert l[0].args[-2:] == ["abc==1.0", "xyz"]
+        wheelhousedir = mocksession.config.wheelhousedir
+        for venv in mocksession.venvlist:
+            assert mocksession.wheelhouseopts(venv) == [
+                "--no-index", "--find-links", str(wheelhousedir)]
+        mocksession._clearmocks()
+        mocksession.buildwheelhouse()
+        assert not mocksession._pcalls
+        # unpinned dependencies are built again once they expire
+        monkeypatch.setattr(tox.session, "WHEELHOUSE_UNPINNED_TTL", -1)
+        assert mocksession.wheelhouseopts(mocksession.venvlist[0])
+        assert mocksession.wheelhouseopts(mocksession.venvlist[1]) is None
+        mocksession.buildwheelhouse()
+        assert len(mocksession._pcalls) == 1
+        assert mocksession._pcalls[0].args[-1] == "xyz"
+        assert "abc==1.0" not in mocksession._pcalls[0].args
+
+    def test_wheelhouse_conflicting_pins(self, newmocksession, monkeypatch):
+        mocksession = newmocksession(["--wheelhouse"], """
+            [testenv]
+            basepython=%s
+            [testenv:one]
+            deps=abc==1.0
+            [testenv:two]
+            deps=abc==2.0
+            [testenv:three]
+            deps=abc==1.0
+                 xyz
+        """ % sys.executable)
+        mocksession.venvlist = [mocksession.getenv(name)
+                                for name in ("one", "two", "three")]
+        popen = tox.session.Action.popen
+
+        def failing_popen(action, args, **kwargs):
+            if "abc==2.0" in args:
+                raise tox.exception.InvocationError("pip wheel", 1)
+            return popen(action, args, **kwargs)
+        monkeypatch.setattr(tox.session.Action, "popen", failing_popen)
+        mocksession.buildwheelhouse()
+        l = mocksession._pcalls
+        assert len(l) == 1
+        assert l[0].args[-2:] == ["abc==1.0", "xyz"]
+        mocksession.report.expect("warning", "*abc==2.0*")
+        one, two, three = mocksession.venvlist
+        assert mocksession.wheelhouseopts(one)
+        assert mocksession.wheelhouseopts(two) is None
+        assert mocksession.wheelhouseopts(three)
+
+    def test_localindex(self, newmocksession):
+        mocksession = newmocksession(["--localindex"], """
+            [testenv]
+            deps=abc
+                 :local:xyz
+        """)
+        venv = mocksession.getenv("python")
+        assert mocksession.config.indexserver["local"].url is None
+        mocksession._localindex = None
+        mocksession.startlocalindex()
+        try:
+            url = mocksession.config.indexserver["local"].url
+            assert url.startswith("http://127.0.0.1:")
+            action = mocksession.newaction(venv, "installdeps")
+            venv._install(venv.envconfig.deps, action=action)
+            l = mocksession._pcalls
+            assert len(l) == 2
+            assert "--extra-index-url" in l[0].args
+            assert l[1].args[l[1].args.index("-i") + 1] == url
+            assert "--extra-index-url" not in l[1].args
+        finally:
+            mocksession.stoplocalindex()
+
+    def test_make_emptydir(self, newconfig):
+        config = newconfig([], "")
+        config.toxworkdir.ensure(".trash", "stale-1-0", "file")
+        session = Session(config)
+        path = config.toxworkdir.ensure("some", "file").dirpath()
+        session.make_emptydir(path)
+        assert path.check(dir=1)
+        assert not path.listdir()
+        session.wait_deletions()
+        assert not config.toxworkdir.join(".trash").listdir()
+
+    def test_worker_keeps_trash(self, newconfig, monkeypatch):
+        from tox.config import PARALLEL_ENV_VAR
+        monkeypatch.setenv(PARALLEL_ENV_VAR, "python")
+        config = newconfig([], "")
+        stale = config.toxworkdir.ensure(".trash", "stale-1-0", "file")
+        Session(config).wait_deletions()
+        assert stale.check()
+
+    def test_report_from_threads(self, newconfig, capfd):
+        import threading
+        session = Session(newconfig([], ""))
+        capfd.readouterr()
+
+        def report(i):
+            for j in range(200):
+                session.report.line("thread %d line %d" % (i, j))
+        threads = [threading.Thread(target=report, args=(i, )) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        lines = capfd.readouterr()[0].splitlines()
+        assert len(lines) == 800
+        assert all(py.std.re.match(r"^thread \d line \d+$", x) for x in lines)
+
+    def test_popen_tee(self, newconfig, capfd, tmpdir):
+        config = newconfig(["--result-json", str(tmpdir.join("result.json"))], "")
+        session = Session(config)
+        action = session.newaction(None, "tee")
+        capfd.readouterr()
+        out = action.popen([sys.executable, "-c",
+                            "import sys; sys.stdout.write('hello\\nworld\\n')"],
+                           redirect=False)
+        assert out.endswith("\n\nhello\nworld\n")
+        assert action.popen_outpath.read() == out
+        assert capfd.readouterr()[0] == "hello\nworld\n"
+
+    def test_popen_tee_leftover_process(self, newconfig, capfd, tmpdir):
+        config = newconfig(["--result-json", str(tmpdir.join("result.json"))], "")
+        session = Session(config)
+        action = session.newaction(None, "tee")
+        code = ("import subprocess, sys; "
+                "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+                "print('started')")
+        started = py.std.time.time()
+        out = action.popen([sys.executable, "-c", code], redirect=False)
+        assert py.std.time.time() - started < 20
+        assert out.endswith("\n\nstarted\n")
+
+    @pytest.mark.parametrize("redirect", [True, False])
+    def test_popen_digest(self, newconfig, tmpdir, redirect):
+        config = newconfig(["--result-json", str(tmpdir.join("result.json"))], "")
+        session = Session(config)
+        action = session.newaction(None, "digest")
+        action.popen([sys.executable, "-c", "print('x' * 100000)"],
+                     redirect=redirect)
+        outputfile = action.commandlog.list[-1]["outputfile"]
+        assert outputfile["sha256"] == file_digest(action.popen_outpath)
+
+    def test_popen_output_limit(self, newconfig, capfd, tmpdir):
+        config = newconfig(["--output-limit", "10"], "")
+        session = Session(config)
+        action = session.newaction(None, "limit")
+        code = "import sys; sys.stdout.write('a' * 100 + 'b' * 100); sys.exit(%d)"
+        out = action.popen([sys.executable, "-c", code % 0])
+        assert out.endswith("b" * 10)
+        assert "bytes left out, see %s" % action.popen_outpath in out
+        outputfile = action.commandlog.list[-1]["outputfile"]
+        assert outputfile["path"] == str(action.popen_outpath)
+        assert outputfile["size"] == action.popen_outpath.size()
+        assert action.commandlog.list[-1]["output"] == out
+        out = action.popen([sys.executable, "-c", code % 0], returnout=True)
+        assert out.endswith("a" * 100 + "b" * 100)
+        with pytest.raises(tox.exception.InvocationError):
+            action.popen([sys.executable, "-c", code % 1])
+        assert "a" * 11 not in capfd.readouterr()[0]
+
     def test_log_pcall(self, mocksession):
         mocksession.config.logdir.ensure(dir=1)
         assert not mocksession.config.logdir.listdir()
@@ -453,6 +733,35 @@ def test_sdist_fails(cmd, initproj):
     ])
 
 
+@pytest.mark.parametrize("args", [[], ["--parallel", "2"]])
+def test_sdist_fails_overlaps_setup(cmd, initproj, args):
+    initproj("pkg123-0.7", filedefs={
+        'setup.py': """
+            import time
+            time.sleep(3)
+            syntax error
+        """,
+        'tox.ini': '''
+            [tox]
+            envlist = noinst, py
+            [testenv]
+            commands = python -c "print('hello {envname}')"
+            [testenv:noinst]
+            skip_install = True
+        ''',
+    })
+    result = cmd.run("tox", *args)
+    assert result.ret == 2
+    out = result.stdout.str()
+    # environments which don't need the package run while it is built
+    assert "hello noinst" in out
+    assert "hello py" not in out
+    assert "py inst:" not in out
+    result.stdout.fnmatch_lines([
+        "*FAIL*could not package project*",
+    ])
+
+
 def test_package_install_fails(cmd, initproj):
     initproj("pkg123-0.7", filedefs={
         'tests': {'test_hello.py': "def test_hello(): pass"},
@@ -538,6 +847,41 @@ class TestToxRun:
             "*python: *failed*",
         ])
 
+    def test_history(self, cmd, example123):
+        result = cmd.run("tox", "--history")
+        assert not result.ret
+        result.stdout.fnmatch_lines(["*no runs recorded*"])
+        for i in range(2):
+            result = cmd.run("tox", "--record-history")
+            assert not result.ret
+        result = cmd.run("tox", "--history", "5")
+        assert not result.ret
+        result.stdout.fnmatch_lines([
+            "*last 2 runs from*",
+            "*time spent per run*p50*p95*",
+            "python *s *s",
+            "*slowest commands*",
+            "*s python: *",
+        ])
+
+    def test_jsonl(self, cmd, example123):
+        jsonpath = cmd.tmpdir.join("res.json")
+        jsonlpath = cmd.tmpdir.join("res.jsonl")
+        result = cmd.run("tox", "--result-json", jsonpath,
+                         "--result-jsonl", jsonlpath)
+        assert not result.ret
+        data = json.load(jsonpath.open("r"))
+        events = [json.loads(line) for line in jsonlpath.read().splitlines()]
+        assert events[0]["event"] == "header"
+        assert events[-1]["event"] == "finish"
+        assert "action" in [x["event"] for x in events]
+        folded = ResultLog.loads_jsonl(jsonlpath.read()).dict
+        verify_json_report_format(folded)
+        envdata = data["testenvs"]["python"]
+        folded_envdata = folded["testenvs"]["python"]
+        for key in ("python", "installed_packages", "test"):
+            assert folded_envdata[key] == envdata[key]
+
 
 def test_develop(initproj, cmd):
     initproj("example123", filedefs={'tox.ini': """
@@ -715,6 +1059,17 @@ def test_sdistonly(initproj, cmd):
     assert "-mvirtualenv" not in result.stdout.str()
 
 
+def test_sdistonly_skipsdist(initproj, cmd):
+    initproj("example123", filedefs={'tox.ini': """
+        [tox]
+        skipsdist = True
+    """})
+    result = cmd.run("tox", "-v", "--sdistonly")
+    assert not result.ret
+    assert "-mvirtualenv" not in result.stdout.str()
+    assert "congratulations" not in result.stdout.str()
+
+
 def test_separate_sdist_no_sdistfile(cmd, initproj):
     distshare = cmd.tmpdir.join("distshare")
     initproj(("pkg123-foo", "0.7"), filedefs={
@@ -865,3 +1220,81 @@ def test_envtmpdir(initproj, cmd):
 
     result = cmd.run("tox")
     assert not result.ret
+
+
+def test_parallel(cmd, initproj):
+    initproj("pkg123-0.7", filedefs={
+        'tox.ini': '''
+            [tox]
+            envlist = good, bad
+            [testenv]
+            commands = python -c "print('hello {envname}')"
+            [testenv:bad]
+            commands = python -c "import sys; sys.exit(3)"
+        '''
+    })
+    jsonpath = cmd.tmpdir.join("res.json")
+    result = cmd.run("tox", "--parallel", "2", "--result-json", jsonpath)
+    assert result.ret == 1
+    out = result.stdout.str()
+    assert "good parallel: finished with exit code 0" in out
+    assert "bad parallel: finished with exit code 1" in out
+    assert "hello good" in out
+    result.stdout.fnmatch_lines([
+        "*summary*",
+        "*good: commands succeeded",
+        "ERROR:*bad: commands failed",
+    ])
+    data = json.load(jsonpath.open("r"))
+    verify_json_report_format(data)
+    assert data["installpkg"]["basename"] == "pkg123-0.7.zip"
+    assert data["testenvs"]["good"]["status"] == 0
+    assert data["testenvs"]["bad"]["status"] == "commands failed"
+
+
+@pytest.mark.parametrize("args", [[], ["--parallel", "2"]])
+def test_depends_order(cmd, initproj, args):
+    initproj("pkg123-0.7", filedefs={
+        'tox.ini': '''
+            [tox]
+            skipsdist = True
+            envlist = coverage, py
+            [testenv]
+            commands = python -c "print('hello {envname}')"
+            [testenv:coverage]
+            depends = py, docs
+        '''
+    })
+    result = cmd.run("tox", *args)
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        "*hello py*",
+        "*hello coverage*",
+        "*summary*",
+        "*coverage: commands succeeded",
+        "*py: commands succeeded",
+    ])
+
+
+def test_wheel(cmd, initproj):
+    initproj("pkg123-0.7", filedefs={
+        'tox.ini': '''
+            [tox]
+            wheel = True
+            [testenv]
+            commands = python -c "import pkg123"
+        '''
+    })
+    result = cmd.run("tox")
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        "*wheel-make*",
+        "*inst: *pkg123-0.7-*.whl",
+    ])
+    result = cmd.run("tox")
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        "*sdist-reuse*",
+        "*wheel-reuse*",
+        "*inst-noop: *pkg123-0.7-*.whl",
+    ])
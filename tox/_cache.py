@@ -0,0 +1,171 @@
+"""
+helpers for the caches which tox keeps in its work directory.
+
+Cache files are small json documents.  They are written atomically so
+that a crashing or concurrently running tox never sees a partial file,
+and a cache which can't be read is simply treated as empty.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import py
+
+
+def statkey(path):
+    """ return a ``[mtime, size, inode]`` list which changes whenever the
+    file at ``path`` is modified or replaced, or None if it doesn't exist. """
+    try:
+        st = os.stat(str(path))
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size, st.st_ino]
+
+
+def file_digest(path, algorithm="sha256"):
+    """ return the hex digest of the contents of ``path``. """
+    h = hashlib.new(algorithm)
+    with open(str(path), "rb") as f:
+        while 1:
+            data = f.read(65536)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+def load_json(path, default=None):
+    """ return the json data stored at ``path`` or ``default`` if the
+    file doesn't exist or can't be parsed. """
+    try:
+        with open(str(path)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def dump_json(path, data):
+    """ atomically replace ``path`` with the json serialization of ``data``. """
+    path = py.path.local(path)
+    path.dirpath().ensure(dir=1)
+    fd, tmp = tempfile.mkstemp(prefix=path.basename, suffix=".tmp",
+                               dir=str(path.dirpath()))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, sort_keys=True)
+        if sys.platform == "win32" and path.check():
+            # os.rename() can't replace existing files on windows
+            path.remove()
+        os.rename(tmp, str(path))
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def sources_fingerprint(rootdir, relpaths, index, ignore=None):
+    """ return a sha256 hex digest over the files ``relpaths`` below
+    ``rootdir`` and the names in the directories which contain them, so
+    that a file added next to them changes it as well.
+
+    ``ignore(path)`` is called for the directory entries (as
+    ``py.path.local``) and can return True to leave them out of the
+    listings.  ``index`` maps relative paths to ``[statkey, digest]`` pairs
+    from a previous call and is updated in place; files whose ``statkey``
+    didn't change are not read again.
+    """
+    rootdir = py.path.local(rootdir)
+    fingerprint = hashlib.sha256()
+    seen = set()
+    dirs = set()
+    for relpath in sorted(set(relpaths)):
+        path = rootdir.join(relpath)
+        dirs.add(path.dirpath().strpath)
+        key = statkey(path)
+        if key is None or not path.check(file=1):
+            digest = "-"
+        else:
+            entry = index.get(relpath)
+            if entry is None or entry[0] != key:
+                entry = index[relpath] = [key, file_digest(path)]
+            seen.add(relpath)
+            digest = entry[1]
+        _update(fingerprint, "%s\0%s\0" % (relpath, digest))
+    for dirpath in sorted(dirs):
+        dirpath = py.path.local(dirpath)
+        try:
+            names = sorted(os.listdir(str(dirpath)))
+        except OSError:
+            names = []
+        if ignore is not None:
+            names = [name for name in names if not ignore(dirpath.join(name))]
+        _update(fingerprint, "%s/\0%s\0" % (dirpath.relto(rootdir),
+                                            "/".join(names)))
+    for relpath in set(index) - seen:
+        del index[relpath]
+    return fingerprint.hexdigest()
+
+
+def _update(h, data):
+    if not isinstance(data, bytes):
+        data = data.encode("utf-8")
+    h.update(data)
+
+
+def clone_tree(src, dst, origin=None, relocate=None, ignore=None):
+    """ recreate the directory tree ``src`` at ``dst``, hardlinking files
+    where possible and copying them otherwise.
+
+    Files for which ``relocate(relpath)`` returns True are copied instead,
+    with every occurrence of the absolute path ``origin`` replaced by
+    ``dst``; symlinks pointing below ``origin`` are redirected likewise.
+    ``ignore(relpath)`` can return True to leave a file or directory out.
+    """
+    src, dst = str(src), str(dst)
+    if origin is not None:
+        origin = str(origin)
+        oldpath, newpath = _tobytes(origin), _tobytes(dst)
+    for dirpath, dirnames, filenames in os.walk(src):
+        reldir = os.path.relpath(dirpath, src)
+        targetdir = os.path.normpath(os.path.join(dst, reldir))
+        if not os.path.isdir(targetdir):
+            os.makedirs(targetdir)
+        subdirs = []
+        for name in dirnames + filenames:
+            relpath = os.path.normpath(os.path.join(reldir, name))
+            if ignore is not None and ignore(relpath):
+                continue
+            source = os.path.join(dirpath, name)
+            target = os.path.join(targetdir, name)
+            if os.path.islink(source):
+                link = os.readlink(source)
+                if origin is not None and (
+                        link == origin or link.startswith(origin + os.sep)):
+                    link = dst + link[len(origin):]
+                os.symlink(link, target)
+                continue
+            if os.path.isdir(source):
+                subdirs.append(name)
+                continue
+            if origin is not None and relocate is not None and relocate(relpath):
+                with open(source, "rb") as f:
+                    data = f.read()
+                if oldpath in data:
+                    with open(target, "wb") as f:
+                        f.write(data.replace(oldpath, newpath))
+                    shutil.copymode(source, target)
+                    continue
+            try:
+                os.link(source, target)
+            except (AttributeError, OSError):
+                shutil.copy2(source, target)
+        dirnames[:] = subdirs
+
+
+def _tobytes(path):
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding())
@@ -0,0 +1,113 @@
+"""
+a sqlite database with the durations of the actions and commands of past
+runs.
+
+A ``HistoryRecorder`` is passed the events of the run's ``ResultLog`` and
+stores them as one run with the ``finish`` event; ``summarize`` reads them
+back for ``tox --history``.
+"""
+import math
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+create table if not exists runs (
+    id integer primary key, started real, retcode integer);
+create table if not exists actions (
+    run integer, env text, msg text, duration real);
+create table if not exists commands (
+    run integer, env text, command text, retcode integer, duration real);
+"""
+
+
+def connect(path):
+    db = sqlite3.connect(str(path))
+    db.executescript(_SCHEMA)
+    return db
+
+
+class HistoryRecorder:
+    """ collect the ``action`` and ``command`` events of a run and add
+    them to the history database at ``path`` with its ``finish`` event. """
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self._actions = []
+        self._commands = []
+        self._lock = threading.Lock()
+
+    def write(self, event):
+        kind = event["event"]
+        with self._lock:
+            if kind == "action":
+                self._actions.append((event["env"], event["msg"], event["duration"]))
+            elif kind == "command":
+                self._addcommand(event["env"], event["command"])
+            elif kind == "testenv":
+                # the entry of an environment run by a parallel worker
+                for log in ("setup", "test"):
+                    for command in event["testenv"].get(log, []):
+                        self._addcommand(event["env"], command)
+        if kind == "finish":
+            self.save(event["retcode"])
+
+    def _addcommand(self, env, command):
+        self._commands.append((env, " ".join(command["command"]),
+                               int(command["retcode"]), command.get("duration")))
+
+    def save(self, retcode):
+        with self._lock:
+            actions, self._actions = self._actions, []
+            commands, self._commands = self._commands, []
+        self.path.dirpath().ensure(dir=1)
+        db = connect(self.path)
+        try:
+            with db:
+                run = db.execute("insert into runs (started, retcode) values (?, ?)",
+                                 (self.started, retcode)).lastrowid
+                db.executemany("insert into actions values (?, ?, ?, ?)",
+                               [(run, ) + x for x in actions])
+                db.executemany("insert into commands values (?, ?, ?, ?, ?)",
+                               [(run, ) + x for x in commands])
+        finally:
+            db.close()
+
+    def close(self):
+        pass
+
+
+def percentile(values, p):
+    """ return the ``p``-th percentile of ``values`` (nearest rank). """
+    values = sorted(values)
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def summarize(path, count, slowest=10):
+    """ return ``(runs, envs, commands)`` for the last ``count`` runs
+    recorded at ``path``: the number of runs found, ``(env, p50, p95)`` of
+    the time spent in the actions of each environment per run and the
+    ``slowest`` commands as ``(duration, env, command, retcode)``. """
+    if not path.check():
+        return 0, [], []
+    db = connect(path)
+    try:
+        ids = [row[0] for row in
+               db.execute("select id from runs order by id desc limit ?", (count, ))]
+        if not ids:
+            return 0, [], []
+        durations = {}
+        for env, duration in db.execute(
+                "select env, sum(duration) from actions where run >= ? "
+                "group by run, env", (min(ids), )):
+            durations.setdefault(env, []).append(duration)
+        commands = db.execute(
+            "select duration, env, command, retcode from commands "
+            "where run >= ? and duration is not null "
+            "order by duration desc limit ?", (min(ids), slowest)).fetchall()
+    finally:
+        db.close()
+    envs = [(env, percentile(x, 50), percentile(x, 95))
+            for env, x in sorted(durations.items())]
+    return len(ids), envs, commands
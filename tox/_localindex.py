@@ -0,0 +1,131 @@
+"""
+a PEP 503 "simple" package index served from local directories.
+
+The index runs in a background thread of the tox process and is bound to
+localhost only.  Projects and files are looked up on every request, so
+archives which show up in the directories while tox is running (e.g. a
+freshly built sdist) are served right away.
+"""
+import os
+import re
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import quote, unquote
+except ImportError:  # python2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import quote, unquote
+
+import py
+
+_rex_sdist = re.compile(r"^(.+?)-\d.*(\.zip|\.tar\.gz|\.tar\.bz2|\.tgz)$")
+
+
+def normalize_name(name):
+    """ return the PEP 503 normalized form of a project name. """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def project_name(filename):
+    """ return the normalized project name of a wheel or sdist file name,
+    or None if ``filename`` is neither. """
+    if filename.endswith(".whl"):
+        return normalize_name(filename.split("-", 1)[0])
+    m = _rex_sdist.match(filename)
+    if m is not None:
+        return normalize_name(m.group(1))
+    return None
+
+
+class LocalIndex:
+    """ serve the wheels and sdists found directly in ``dirs`` as a simple
+    index at ``url`` between ``start()`` and ``stop()``. """
+
+    def __init__(self, dirs):
+        self.dirs = [py.path.local(x) for x in dirs]
+        self.url = None
+        self._server = None
+
+    def projects(self):
+        """ return a dict mapping normalized project names to lists of
+        ``(dirindex, filename)`` pairs. """
+        projects = {}
+        for i, dirpath in enumerate(self.dirs):
+            try:
+                names = sorted(os.listdir(str(dirpath)))
+            except OSError:
+                continue
+            for filename in names:
+                name = project_name(filename)
+                if name is not None:
+                    projects.setdefault(name, []).append((i, filename))
+        return projects
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.index = self
+        self.url = "http://127.0.0.1:%d/simple/" % self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        index = self.server.index
+        parts = [unquote(x) for x in self.path.split("?", 1)[0].split("/") if x]
+        if parts == ["simple"]:
+            links = ['<a href="%s/">%s</a>' % (quote(name), name)
+                     for name in sorted(index.projects())]
+            return self._send_html("Simple index", links)
+        if len(parts) == 2 and parts[0] == "simple":
+            files = index.projects().get(normalize_name(parts[1]))
+            if files is not None:
+                links = ['<a href="/files/%d/%s">%s</a>' % (i, quote(filename), filename)
+                         for i, filename in files]
+                return self._send_html("Links for %s" % parts[1], links)
+        if len(parts) == 3 and parts[0] == "files" and parts[1].isdigit() and \
+                int(parts[1]) < len(index.dirs) and project_name(parts[2]) and \
+                "/" not in parts[2] and "\\" not in parts[2]:
+            path = index.dirs[int(parts[1])].join(parts[2])
+            if path.check(file=1):
+                return self._send_file(path)
+        self.send_error(404)
+
+    def _send_html(self, title, links):
+        body = "<!DOCTYPE html>\n<html><head><title>%s</title></head><body>\n%s\n" \
+               "</body></html>\n" % (title, "<br/>\n".join(links))
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path):
+        with open(str(path), "rb") as f:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            while 1:
+                data = f.read(65536)
+                if not data:
+                    break
+                self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # pip's requests are not worth reporting
@@ -145,6 +145,8 @@ def mocksession(request):
             self.config = request.getfuncargvalue("newconfig")([], "")
             self.resultlog = ResultLog()
             self._actions = []
+            self._localindex = None
+            self._packaging = None
 
         def getenv(self, name):
             return VirtualEnv(self.config.envconfigs[name], session=self)
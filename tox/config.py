@@ -8,6 +8,7 @@ import shlex
 import string
 import pkg_resources
 import itertools
+import multiprocessing
 import pluggy
 from subprocess import list2cmdline
 
@@ -30,6 +31,10 @@ hookimpl = pluggy.HookimplMarker("tox")
 
 _dummy = object()
 
+#: environment variable through which a ``--parallel`` run tells each of
+#: its worker processes which test environment it should run
+PARALLEL_ENV_VAR = "TOX_PARALLEL_ENV"
+
 
 def get_plugin_manager(plugins=()):
     # initialize plugin manager
@@ -205,6 +210,7 @@ def parseconfig(args=None, plugins=()):
 
     if args is None:
         args = sys.argv[1:]
+    args = list(args)
 
     # prepare command line options
     parser = Parser()
@@ -214,6 +220,7 @@ def parseconfig(args=None, plugins=()):
     option = parser._parse_args(args)
     interpreters = tox.interpreters.Interpreters(hook=pm.hook)
     config = Config(pluginmanager=pm, option=option, interpreters=interpreters)
+    config.args = args
     config._parser = parser
     config._testenv_attr = parser._testenv_attr
 
@@ -257,6 +264,29 @@ def feedback(msg, sysexit=False):
         raise SystemExit(1)
 
 
+def parallel_type(value):
+    if value == "auto":
+        return value
+    try:
+        value = int(value)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            "expected a positive number of processes or 'auto'")
+    return value
+
+
+def history_type(value):
+    try:
+        value = int(value)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError("expected a positive number of runs")
+    return value
+
+
 class VersionAction(argparse.Action):
     def __call__(self, argparser, *args, **kwargs):
         version = tox.__version__
@@ -332,6 +362,34 @@ def tox_addoption(parser):
                         help="skip invoking test commands.")
     parser.add_argument("--sdistonly", action="store_true", dest="sdistonly",
                         help="only perform the sdist packaging activity.")
+    parser.add_argument("--force-sdist", action="store_true", dest="force_sdist",
+                        help="always run the sdist packaging activity, even if the "
+                             "project sources didn't change since the last run.")
+    parser.add_argument("--wheel", action="store_true", dest="wheel",
+                        help="build a wheel of the project once and install it into "
+                             "all test environments with a compatible interpreter.")
+    parser.add_argument("--wheelhouse", action="store_true", dest="wheelhouse",
+                        help="build wheels of the dependencies of all test environments "
+                             "once and install them from there without an index.")
+    parser.add_argument("--localindex", action="store_true", dest="localindex",
+                        help="serve distshare, distdir and the wheelhouse as a package "
+                             "index on localhost and use it for all installs.")
+    parser.add_argument("--batchinstall", action="store_true", dest="batchinstall",
+                        help="install dependencies from several index servers with a "
+                             "single pip run, using extra index urls.")
+    parser.add_argument("--lockdeps", action="store_true", dest="lockdeps",
+                        help="install the dependencies of new test environments from "
+                             "their lock files, writing those if needed.")
+    parser.add_argument("--relock", action="store_true", dest="relock",
+                        help="recreate the test environments and refresh their lock "
+                             "files (implies --lockdeps).")
+    parser.add_argument("--scaninstalled", action="store_true", dest="scaninstalled",
+                        help="report the packages installed in test environments by "
+                             "reading their metadata instead of running "
+                             "list_dependencies_command.")
+    parser.add_argument("--envtemplates", action="store_true", dest="envtemplates",
+                        help="create test environments by copying a previously built "
+                             "one with the same interpreter and dependencies.")
     parser.add_argument("--installpkg", action="store", default=None,
                         metavar="PATH",
                         help="use specified package for installation into venv, instead of "
@@ -354,6 +412,30 @@ def tox_addoption(parser):
                         dest="resultjson", metavar="PATH",
                         help="write a json file with detailed information "
                         "about all commands and results involved.")
+    parser.add_argument("--result-jsonl", action="store",
+                        dest="resultjsonl", metavar="PATH",
+                        help="write the information of --result-json to a file as "
+                             "lines of json, one event per action or command as it "
+                             "finishes.")
+    parser.add_argument("--output-limit", action="store", type=int,
+                        dest="outputlimit", metavar="BYTES", default=None,
+                        help="of long command output keep only the first and the last "
+                             "BYTES bytes in memory, for the --result-json log and error "
+                             "reports (0 keeps everything, default: 65536).")
+    parser.add_argument("--record-history", action="store_true", dest="recordhistory",
+                        help="record the durations of actions and commands in "
+                             "{toxworkdir}/.history.sqlite, for --history.")
+    parser.add_argument("--history", action="store", nargs="?", const=10,
+                        type=history_type,
+                        dest="history", metavar="N",
+                        help="show the median and 95th percentile of the time spent "
+                             "on each test environment and the slowest commands over "
+                             "the last N recorded runs (default: 10).")
+    parser.add_argument("--parallel", action="store", nargs="?", const="auto",
+                        type=parallel_type, dest="parallel", metavar="N",
+                        help="run up to N test environments at the same time in "
+                             "separate worker processes. 'auto' (the default if N "
+                             "is omitted) uses one process per CPU.")
 
     # We choose 1 to 4294967295 because it is the range of PYTHONHASHSEED.
     parser.add_argument("--hashseed", action="store",
@@ -440,7 +522,8 @@ def tox_addoption(parser):
              "result error status.")
 
     def recreate(testenv_config, value):
-        if testenv_config.config.option.recreate:
+        option = testenv_config.config.option
+        if option.recreate or option.relock:
             return True
         return value
 
@@ -539,6 +622,11 @@ def tox_addoption(parser):
         default="pip freeze",
         help="list dependencies for a virtual environment")
 
+    parser.add_testenv_attribute(
+        name="lockfile", type="path", default="{toxinidir}/tox-{envname}.lock",
+        help="file recording the exact dependencies installed when the "
+             "'lockdeps' setting is enabled.")
+
     parser.add_testenv_attribute_obj(DepOption())
 
     parser.add_testenv_attribute(
@@ -555,6 +643,14 @@ def tox_addoption(parser):
         help="list of extras to install with the source distribution or "
              "develop install")
 
+    def depends(testenv_config, value):
+        return _split_env(",".join(value))
+
+    parser.add_testenv_attribute(
+        name="depends", type="line-list", postprocess=depends,
+        help="names of test environments which have to finish before this one "
+             "starts. Environments which are not part of the run are ignored.")
+
 
 class Config(object):
     """ Global Tox config object. """
@@ -695,6 +791,18 @@ class parseini:
             hashseed = config.option.hashseed
         config.hashseed = hashseed
 
+        # a worker process of a parallel run only executes the single
+        # test environment it was started for and never spawns workers.
+        # The variable is meant for this process only, not for the
+        # installs and commands it runs (e.g. a nested tox).
+        config.parallel_env = os.environ.pop(PARALLEL_ENV_VAR, None) or None
+        if config.parallel_env or not config.option.parallel:
+            config.parallel = 0
+        elif config.option.parallel == "auto":
+            config.parallel = multiprocessing.cpu_count()
+        else:
+            config.parallel = config.option.parallel
+
         reader.addsubstitutions(toxinidir=config.toxinidir,
                                 homedir=config.homedir)
         # As older versions of tox may have bugs or incompatabilities that
@@ -743,6 +851,12 @@ class parseini:
             for name in config.indexserver:
                 config.indexserver[name] = IndexServerConfig(name, override)
 
+        config.localindex = (config.option.localindex
+                             or reader.getbool("localindex", False))
+        if config.localindex:
+            # the session sets the url once it serves the index
+            config.indexserver.setdefault("local", IndexServerConfig("local"))
+
         reader.addsubstitutions(toxworkdir=config.toxworkdir)
         config.distdir = reader.getpath("distdir", "{toxworkdir}/dist")
         reader.addsubstitutions(distdir=config.distdir)
@@ -751,6 +865,12 @@ class parseini:
         config.sdistsrc = reader.getpath("sdistsrc", None)
         config.setupdir = reader.getpath("setupdir", "{toxinidir}")
         config.logdir = config.toxworkdir.join("log")
+        config.interpreters.cachepath = config.toxworkdir.join(".interpreters")
+        config.digestcachepath = config.toxworkdir.join(".digests")
+        config.wheeldir = config.toxworkdir.join("wheel")
+        config.wheelhousedir = config.toxworkdir.join("wheelhouse")
+        config.wheelhouserecord = config.toxworkdir.join(".wheelhouse")
+        config.historypath = config.toxworkdir.join(".history.sqlite")
 
         config.envlist, all_envs = self._getenvdata(reader)
 
@@ -778,6 +898,53 @@ class parseini:
                           for name in config.envlist)
 
         config.skipsdist = reader.getbool("skipsdist", all_develop)
+        config.wheel = config.option.wheel or reader.getbool("wheel", False)
+        config.wheelhouse = (config.option.wheelhouse
+                             or reader.getbool("wheelhouse", False))
+        config.batchinstall = (config.option.batchinstall
+                               or reader.getbool("batchinstall", False))
+        config.lockdeps = (config.option.lockdeps or config.option.relock
+                           or reader.getbool("lockdeps", False))
+        config.scaninstalled = (config.option.scaninstalled
+                                or reader.getbool("scaninstalled", False))
+        config.envtemplates = (config.option.envtemplates
+                               or reader.getbool("envtemplates", False))
+        config.recordhistory = (config.option.recordhistory
+                                or reader.getbool("recordhistory", False))
+        outputlimit = config.option.outputlimit
+        if outputlimit is None:
+            outputlimit = reader.getstring("outputlimit", "65536")
+        try:
+            config.outputlimit = int(outputlimit)
+        except ValueError:
+            raise tox.exception.ConfigError(
+                "outputlimit: %r is not a number of bytes" % (outputlimit,))
+        if config.parallel_env and not config.option.installpkg:
+            # the parallel run packages the project once and hands the
+            # package to every worker which needs it via --installpkg
+            config.skipsdist = True
+
+        self._check_depends_cycles()
+
+    def _check_depends_cycles(self):
+        envconfigs = self.config.envconfigs
+        done = set()
+
+        def visit(name, path):
+            if name in path:
+                cycle = path[path.index(name):] + [name]
+                raise tox.exception.ConfigError(
+                    "circular dependency between test environments: %s" %
+                    " -> ".join(cycle))
+            if name in done:
+                return
+            for dep in envconfigs[name].depends:
+                if dep in envconfigs:
+                    visit(dep, path + [name])
+            done.add(name)
+
+        for name in sorted(envconfigs):
+            visit(name, [])
 
     def _list_section_factors(self, section):
         factors = set()
@@ -837,6 +1004,10 @@ class parseini:
         if not envlist or "ALL" in envlist:
             envlist = sorted(all_envs)
 
+        if self.config.parallel_env:
+            envlist = [self.config.parallel_env]
+            all_envs.add(self.config.parallel_env)
+
         return envlist, all_envs
 
 
@@ -2,7 +2,16 @@ import sys
 import py
 import re
 import inspect
+import threading
 from tox import hookimpl
+from tox._cache import dump_json, load_json, statkey
+
+#: bump whenever the information gathered by pyinfo() changes
+INFO_CACHE_VERSION = 2
+
+#: prefix passed to pyinfo() so that the site-packages directory of any
+#: virtualenv can be derived from its result without starting a process
+ENVDIR_MARKER = "__TOX_ENVDIR__"
 
 
 class Interpreters:
@@ -10,6 +19,37 @@ class Interpreters:
         self.name2executable = {}
         self.executable2info = {}
         self.hook = hook
+        #: json file persisting interpreter information across tox runs,
+        #: set once the tox working directory is known
+        self.cachepath = None
+        self._cachelock = threading.Lock()
+
+    def discover(self, envconfigs):
+        """ look up and probe the interpreters of all given test environments
+        up front, one thread per distinct ``basepython``, so that the
+        environments don't have to start them one after the other. """
+        groups = {}
+        for envconfig in envconfigs:
+            groups.setdefault(envconfig.basepython, []).append(envconfig)
+
+        def discover_group(envconfigs):
+            for envconfig in envconfigs:
+                try:
+                    self.get_info(envconfig)
+                except Exception:
+                    pass  # reported when the environment gets set up
+
+        threads = []
+        for basepython in sorted(groups, key=str):
+            thread = threading.Thread(target=discover_group,
+                                      args=(groups[basepython],))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            while thread.is_alive():
+                # wait with a timeout, python2 can't interrupt a plain join()
+                thread.join(60)
 
     def get_executable(self, envconfig):
         """ return path object to the executable for the given
@@ -32,14 +72,55 @@ class Interpreters:
         try:
             return self.executable2info[executable]
         except KeyError:
-            info = run_and_get_interpreter_info(name, executable)
+            info = self._getcachedinfo(name, executable)
+            if info is None:
+                info = run_and_get_interpreter_info(name, executable)
+                self._cacheinfo(executable, info)
             self.executable2info[executable] = info
             return info
 
+    def _loadcache(self):
+        data = load_json(self.cachepath, {})
+        if data.get("version") != INFO_CACHE_VERSION:
+            return {}
+        return data.get("interpreters", {})
+
+    def _getcachedinfo(self, name, executable):
+        if self.cachepath is None:
+            return None
+        entry = self._loadcache().get(str(executable))
+        if entry is None or entry["statkey"] != statkey(executable):
+            return None
+        result = entry["info"]
+        result["version_info"] = tuple(result["version_info"])
+        return InterpreterInfo(name, executable, **result)
+
+    def _cacheinfo(self, executable, info):
+        """ persist ``info`` keyed by the executable's path and stat
+        information, so that replacing the interpreter invalidates it. """
+        if self.cachepath is None or not info.runnable or is_script(executable):
+            return
+        with self._cachelock:
+            interpreters = self._loadcache()
+            interpreters[str(executable)] = {
+                "statkey": statkey(executable),
+                "info": dict(version_info=info.version_info,
+                             sysplatform=info.sysplatform,
+                             version=info.version,
+                             sitepackages=info.sitepackages)}
+            try:
+                dump_json(self.cachepath, {"version": INFO_CACHE_VERSION,
+                                           "interpreters": interpreters})
+            except EnvironmentError:
+                pass  # the cache is an optimization only
+
     def get_sitepackagesdir(self, info, envdir):
         if not info.executable:
             return ""
         envdir = str(envdir)
+        template = getattr(info, "sitepackages", None)
+        if template and template.startswith(ENVDIR_MARKER):
+            return envdir + template[len(ENVDIR_MARKER):]
         try:
             res = exec_on_interpreter(info.executable,
                                       [inspect.getsource(sitepackagesdir),
@@ -56,7 +137,8 @@ def run_and_get_interpreter_info(name, executable):
     assert executable
     try:
         result = exec_on_interpreter(executable,
-                                     [inspect.getsource(pyinfo), "print(pyinfo())"])
+                                     [inspect.getsource(pyinfo),
+                                      "print(pyinfo(%r))" % ENVDIR_MARKER])
     except ExecFailed:
         val = sys.exc_info()[1]
         return NoInterpreterInfo(name, executable=val.executable,
@@ -65,6 +147,16 @@ def run_and_get_interpreter_info(name, executable):
         return InterpreterInfo(name, executable, **result)
 
 
+def is_script(executable):
+    """ return True if ``executable`` is a script (like the shims of pyenv)
+    which may run a different interpreter without changing itself. """
+    try:
+        with open(str(executable), "rb") as f:
+            return f.read(2) == b"#!"
+    except EnvironmentError:
+        return True
+
+
 def exec_on_interpreter(executable, source):
     if isinstance(source, list):
         source = "\n".join(source)
@@ -94,12 +186,18 @@ class ExecFailed(Exception):
 class InterpreterInfo:
     runnable = True
 
-    def __init__(self, name, executable, version_info, sysplatform):
+    def __init__(self, name, executable, version_info, sysplatform,
+                 version=None, sitepackages=None):
         assert executable and version_info
         self.name = name
         self.executable = executable
         self.version_info = version_info
         self.sysplatform = sysplatform
+        #: the interpreter's ``sys.version``
+        self.version = version
+        #: site-packages directory of a virtualenv, relative to
+        #: ``ENVDIR_MARKER`` (see ``Interpreters.get_sitepackagesdir``)
+        self.sitepackages = sitepackages
 
     def __str__(self):
         return "<executable at %s, version_info %s>" % (
@@ -173,10 +271,17 @@ else:
                     return exe
 
 
-def pyinfo():
+def pyinfo(envdir_marker):
     import sys
+    try:
+        from distutils.sysconfig import get_python_lib
+        sitepackages = get_python_lib(prefix=envdir_marker)
+    except Exception:
+        sitepackages = None
     return dict(version_info=tuple(sys.version_info),
-                sysplatform=sys.platform)
+                sysplatform=sys.platform,
+                version=sys.version,
+                sitepackages=sitepackages)
 
 
 def sitepackagesdir(envdir):
@@ -1,5 +1,8 @@
 import sys
+import threading
+import time
 import py
+import tox
 from tox import __version__ as toxver
 import json
 
@@ -13,6 +16,22 @@ class ResultLog:
         self.dict.update({"reportversion": "1", "toxversion": toxver})
         self.dict["platform"] = sys.platform
         self.dict["host"] = py.std.socket.getfqdn()
+        self.streams = []
+
+    def add_stream(self, stream):
+        """ pass everything recorded from now on to ``stream`` as events,
+        starting with the header of the log. """
+        self.streams.append(stream)
+        header = dict((key, self.dict[key]) for key in
+                      ("reportversion", "toxversion", "platform", "host"))
+        stream.write(dict(header, event="header", time=time.time()))
+
+    def emit(self, event, **data):
+        if self.streams:
+            data["event"] = event
+            data["time"] = time.time()
+            for stream in self.streams:
+                stream.write(data)
 
     def set_header(self, installpkg):
         """
@@ -23,6 +42,7 @@ class ResultLog:
             sha256=installpkg.computehash("sha256"),
             basename=installpkg.basename,
         )
+        self.emit("installpkg", installpkg=self.dict["installpkg"])
 
     def get_envlog(self, name):
         testenvs = self.dict.setdefault("testenvs", {})
@@ -36,6 +56,54 @@ class ResultLog:
     def loads_json(cls, data):
         return cls(json.loads(data))
 
+    @classmethod
+    def loads_jsonl(cls, data):
+        """ fold the events written by a ``JsonLinesWriter`` back into a
+        result log.  Events which aren't part of the result log, like
+        ``action``, are skipped. """
+        log = cls()
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            kind = event.pop("event")
+            del event["time"]
+            if kind == "header":
+                log.dict.update(event)
+            elif kind == "installpkg":
+                log.dict["installpkg"] = event["installpkg"]
+            elif kind in ("python", "command", "installed", "status", "testenv"):
+                testenvs = log.dict.setdefault("testenvs", {})
+                d = testenvs.setdefault(event.pop("env"), {})
+                if kind == "command":
+                    d.setdefault(event["log"], []).append(event["command"])
+                elif kind == "testenv":
+                    d.clear()
+                    d.update(event["testenv"])
+                else:
+                    d.update(event)
+        return log
+
+
+class JsonLinesWriter:
+    """ write events to the file at ``path`` as lines of json, each one
+    as soon as it happens, so that the file can be followed while tox is
+    running. """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = path.open("w")
+        self._lock = threading.Lock()
+
+    def write(self, event):
+        line = json.dumps(event, sort_keys=True) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
 
 class EnvLog:
     def __init__(self, reportlog, name, dict):
@@ -43,7 +111,17 @@ class EnvLog:
         self.name = name
         self.dict = dict
 
-    def set_python_info(self, pythonexecutable):
+    def set_python_info(self, pythonexecutable, info=None):
+        """ record executable and version of the given python.  If the
+        ``InterpreterInfo`` of the interpreter it derives from is passed
+        (e.g. a virtualenv's base python) no process needs to be started. """
+        if info is not None and getattr(info, "version", None):
+            self.dict["python"] = dict(
+                executable=str(pythonexecutable),
+                version_info=list(info.version_info),
+                version=info.version)
+            self.reportlog.emit("python", env=self.name, python=self.dict["python"])
+            return
         pythonexecutable = py.path.local(pythonexecutable)
         out = pythonexecutable.sysexec("-c",
                                        "import sys; "
@@ -58,24 +136,61 @@ class EnvLog:
             executable=executable,
             version_info=version_info,
             version=version)
+        self.reportlog.emit("python", env=self.name, python=self.dict["python"])
 
     def get_commandlog(self, name):
         l = self.dict.setdefault(name, [])
-        return CommandLog(self, l)
+        return CommandLog(self, l, name)
 
     def set_installed(self, packages):
-        self.dict["installed_packages"] = packages
+        """ record the installed packages, either as the output lines of
+        the ``list_dependencies_command`` or as ``(name, version)`` pairs;
+        the latter are also stored by name in ``installed_versions``. """
+        data = {}
+        if packages and isinstance(packages[0], tuple):
+            data["installed_versions"] = dict(packages)
+            packages = ["%s==%s" % package for package in packages]
+        data["installed_packages"] = packages
+        self.dict.update(data)
+        self.reportlog.emit("installed", env=self.name, **data)
+
+    def set_status(self, status):
+        """ record the final status of the test environment.  tox
+        exceptions are stored by name so that ``get_status`` can turn
+        them back into exception instances. """
+        if isinstance(status, tox.exception.Error):
+            status = dict(exception=status.__class__.__name__,
+                          message=str(status.args[0]))
+        self.dict["status"] = status
+        self.reportlog.emit("status", env=self.name, status=status)
+
+    def get_status(self):
+        status = self.dict.get("status")
+        if isinstance(status, dict):
+            cls = getattr(tox.exception, status["exception"], tox.exception.Error)
+            status = cls(status["message"])
+        return status
 
 
 class CommandLog:
-    def __init__(self, envlog, list):
+    def __init__(self, envlog, list, name=None):
         self.envlog = envlog
         self.list = list
+        self.name = name
 
-    def add_command(self, argv, output, retcode):
+    def add_command(self, argv, output, retcode, outputfile=None, duration=None):
+        """ record a command with its (possibly shortened) ``output``.
+        ``outputfile`` refers to the log file with all of the output as a
+        dict with its ``path``, ``size`` and ``sha256`` digest. """
         d = {}
         self.list.append(d)
         d["command"] = argv
         d["output"] = output
         d["retcode"] = str(retcode)
+        if outputfile is not None:
+            d["outputfile"] = outputfile
+        if duration is not None:
+            d["duration"] = duration
+        self.envlog.reportlog.emit("command", env=self.envlog.name, log=self.name,
+                                   command=d)
         return d
@@ -8,20 +8,40 @@ from __future__ import with_statement
 
 import tox
 import py
+import hashlib
+import itertools
 import os
 import sys
 import subprocess
+import threading
+import zipfile
 from tox._verlib import NormalizedVersion, IrrationalVersionError
-from tox.venv import VirtualEnv
-from tox.config import parseconfig
-from tox.result import ResultLog
+from tox.venv import VirtualEnv, getdepname, getdigest
+from tox.config import parseconfig, PARALLEL_ENV_VAR
+from tox.result import JsonLinesWriter, ResultLog
+from tox._localindex import LocalIndex
+from tox._history import HistoryRecorder, summarize
+from tox._cache import dump_json, file_digest, load_json, sources_fingerprint, statkey
 from subprocess import STDOUT
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 
 def now():
     return py.std.time.time()
 
 
+#: seconds for which wheels of dependencies without an exact version pin
+#: are reused from the wheelhouse before they are built again
+WHEELHOUSE_UNPINNED_TTL = 3600
+
+_rex_pinned = py.std.re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*\s*(\[[^\]]*\])?\s*"
+                                r"===?\s*[^\s,;*]+$")
+
+
 def prepare(args):
     config = parseconfig(args)
     if config.option.help:
@@ -68,6 +88,44 @@ def show_help_ini(config):
         tw.line()
 
 
+#: serializes picking log file names, actions may run in several threads
+_logpath_lock = threading.Lock()
+
+
+def _read_output(path, limit):
+    """ return the contents of the log file ``path``.  If it has more than
+    twice ``limit`` bytes only the first and the last ``limit`` bytes are
+    read, with a note about the part left out in between. """
+    with path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not limit or size <= 2 * limit:
+            data = f.read()
+        else:
+            head = f.read(limit)
+            f.seek(-limit, 2)
+            note = "\n[... %d bytes left out, see %s ...]\n" % (size - 2 * limit, path)
+            data = head + note.encode("utf-8") + f.read()
+    if not isinstance(data, str):
+        data = data.decode("utf-8", "replace")
+    return data
+
+
+def _read_chunks(stream, chunks):
+    """ put the chunks read from the pipe ``stream`` into the queue
+    ``chunks`` until it is closed, then an empty one, and close it. """
+    fd = stream.fileno()
+    try:
+        while 1:
+            # returns whatever is available, blocking only while the pipe
+            # is empty, so a dot per test shows up right away
+            data = os.read(fd, 65536)
+            chunks.put(data)
+            if not data:
+                break
+    finally:
+        stream.close()
+
+
 class Action(object):
     def __init__(self, session, venv, msg, args):
         self.venv = venv
@@ -107,34 +165,37 @@ class Action(object):
             logdir = self.venv.envconfig.envlogdir
         else:
             logdir = self.session.config.logdir
-        try:
-            l = logdir.listdir("%s-*" % actionid)
-        except py.error.ENOENT:
-            logdir.ensure(dir=1)
-            l = []
-        num = len(l)
-        path = logdir.join("%s-%s.log" % (actionid, num))
-        f = path.open('w')
+        with _logpath_lock:
+            try:
+                l = logdir.listdir("%s-*" % actionid)
+            except py.error.ENOENT:
+                logdir.ensure(dir=1)
+                l = []
+            num = len(l)
+            path = logdir.join("%s-%s.log" % (actionid, num))
+            f = path.open('w')
         f.flush()
         return f
 
     def popen(self, args, cwd=None, env=None, redirect=True, returnout=False, ignore_ret=False):
         stdout = outpath = None
-        resultjson = self.session.config.option.resultjson
+        option = self.session.config.option
+        resultjson = option.resultjson
+        tee = resultjson and not redirect
         if resultjson or redirect:
             fout = self._initlogpath(self.id)
             fout.write("actionid: %s\nmsg: %s\ncmdargs: %r\nenv: %s\n\n" % (
                 self.id, self.msg, args, env))
             fout.flush()
             self.popen_outpath = outpath = py.path.local(fout.name)
-            fin = outpath.open()
-            fin.read()  # read the header, so it won't be written to stdout
-            stdout = fout
+            # with tee the output reaches the log file through a pipe
+            stdout = subprocess.PIPE if tee else fout
         elif returnout:
             stdout = subprocess.PIPE
         if cwd is None:
             # XXX cwd = self.session.config.cwd
             cwd = py.path.local()
+        started = now()
         try:
             popen = self._popen(args, cwd, env=env,
                                 stdout=stdout, stderr=STDOUT)
@@ -143,6 +204,7 @@ class Action(object):
                               (e.errno, args, cwd))
             raise
         popen.outpath = outpath
+        popen.sha256 = None
         popen.args = [str(x) for x in args]
         popen.cwd = cwd
         popen.action = self
@@ -150,31 +212,10 @@ class Action(object):
         try:
             self.report.logpopen(popen, env=env)
             try:
-                if resultjson and not redirect:
+                if tee:
                     assert popen.stderr is None  # prevent deadlock
                     out = None
-                    last_time = now()
-                    while 1:
-                        fin_pos = fin.tell()
-                        # we have to read one byte at a time, otherwise there
-                        # might be no output for a long time with slow tests
-                        data = fin.read(1)
-                        if data:
-                            sys.stdout.write(data)
-                            if '\n' in data or (now() - last_time) > 1:
-                                # we flush on newlines or after 1 second to
-                                # provide quick enough feedback to the user
-                                # when printing a dot per test
-                                sys.stdout.flush()
-                                last_time = now()
-                        elif popen.poll() is not None:
-                            if popen.stdout is not None:
-                                popen.stdout.close()
-                            break
-                        else:
-                            py.std.time.sleep(0.1)
-                            fin.seek(fin_pos)
-                    fin.close()
+                    popen.sha256 = self._tee(popen, fout)
                 else:
                     out, err = popen.communicate()
             except KeyboardInterrupt:
@@ -182,27 +223,80 @@ class Action(object):
                 popen.wait()
                 raise KeyboardInterrupt()
             ret = popen.wait()
+            popen.duration = now() - started
+            if outpath and popen.sha256 is None and \
+                    (resultjson or option.resultjsonl):
+                popen.sha256 = file_digest(outpath)
         finally:
             self._popenlist.remove(popen)
+        limit = self.session.config.outputlimit
         if ret and not ignore_ret:
             invoked = " ".join(map(str, popen.args))
             if outpath:
                 self.report.error("invocation failed (exit code %d), logfile: %s" %
                                   (ret, outpath))
-                out = outpath.read()
+                out = _read_output(outpath, limit)
                 self.report.error(out)
-                if hasattr(self, "commandlog"):
-                    self.commandlog.add_command(popen.args, out, ret)
+                self._logcommand(popen, out, ret)
                 raise tox.exception.InvocationError(
                     "%s (see %s)" % (invoked, outpath), ret)
             else:
                 raise tox.exception.InvocationError("%r" % (invoked, ), ret)
-        if not out and outpath:
-            out = outpath.read()
-        if hasattr(self, "commandlog"):
-            self.commandlog.add_command(popen.args, out, ret)
+        logged = out
+        if outpath:
+            # only callers asking for the output get all of it in memory
+            logged = out = _read_output(outpath, limit)
+            if returnout:
+                out = outpath.read()
+        self._logcommand(popen, logged, ret)
         return out
 
+    def _logcommand(self, popen, out, ret):
+        if not hasattr(self, "commandlog"):
+            return
+        outputfile = None
+        if popen.outpath:
+            outputfile = dict(path=str(popen.outpath), size=popen.outpath.size())
+            if popen.sha256 is not None:
+                outputfile["sha256"] = popen.sha256
+        self.commandlog.add_command(popen.args, out, ret, outputfile,
+                                    popen.duration)
+
+    def _tee(self, popen, fout):
+        """ copy the output of ``popen`` to the log file ``fout`` and to
+        stdout in chunks as soon as it arrives, until the command exited
+        and the pipe is drained; processes it left behind holding the pipe
+        don't keep tox waiting.  Return the sha256 digest of the log file,
+        computed on the way. """
+        chunks = queue.Queue()
+        reader = threading.Thread(target=_read_chunks, args=(popen.stdout, chunks))
+        reader.daemon = True
+        reader.start()
+        stdout = getattr(sys.stdout, "buffer", sys.stdout)
+        fout.flush()
+        with open(fout.name, "rb") as f:
+            digest = hashlib.sha256(f.read())  # the header
+        sys.stdout.flush()
+        exited = False
+        with open(fout.name, "ab") as log:
+            while 1:
+                try:
+                    data = chunks.get(timeout=0.1)
+                except queue.Empty:
+                    # stop after a quiet period following the command's exit
+                    if exited:
+                        break
+                    exited = popen.poll() is not None
+                    continue
+                if not data:
+                    break
+                log.write(data)
+                log.flush()
+                digest.update(data)
+                stdout.write(data)
+                stdout.flush()
+        return digest.hexdigest()
+
     def _rewriteargs(self, cwd, args):
         newargs = []
         for arg in args:
@@ -235,6 +329,8 @@ class Reporter(object):
         self.tw = py.io.TerminalWriter()
         self.session = session
         self._reportedlines = []
+        # actions may report from several threads, keep their lines whole
+        self._lock = threading.RLock()
         # self.cumulated_time = 0.0
 
     @property
@@ -264,9 +360,12 @@ class Reporter(object):
         self.verbosity2("%s finish: %s after %.2f seconds" % (
             action.venvname, action.msg, duration), bold=True)
         delattr(action, '_starttime')
+        self.session.resultlog.emit("action", env=action.venvname,
+                                    msg=action.msg, duration=duration)
 
     def startsummary(self):
-        self.tw.sep("_", "summary")
+        with self._lock:
+            self.tw.sep("_", "summary")
 
     def info(self, msg):
         if self.verbosity >= 2:
@@ -285,9 +384,10 @@ class Reporter(object):
     def keyvalue(self, name, value):
         if name.endswith(":"):
             name += " "
-        self.tw.write(name, bold=True)
-        self.tw.write(value)
-        self.tw.line()
+        with self._lock:
+            self.tw.write(name, bold=True)
+            self.tw.write(value)
+            self.tw.line()
 
     def line(self, msg, **opts):
         self.logline(msg, **opts)
@@ -305,8 +405,9 @@ class Reporter(object):
         self.logline("SKIPPED:" + msg, yellow=True)
 
     def logline(self, msg, **opts):
-        self._reportedlines.append(msg)
-        self.tw.line("%s" % msg, **opts)
+        with self._lock:
+            self._reportedlines.append(msg)
+            self.tw.line("%s" % msg, **opts)
 
     def verbosity0(self, msg, **opts):
         if self.verbosity >= 0:
@@ -324,6 +425,56 @@ class Reporter(object):
     #    py.builtin.print_(msg, file=sys.stderr)
 
 
+def _addwheelgroup(groups, group, deps):
+    """ add the wheelhouse dependencies ``deps`` (mapping keys to ``(dep,
+    pinned)``) of one environment to the first of the ``(group, deps)``
+    pairs in ``groups`` which doesn't require a different version of one
+    of their projects, or append a new one. """
+    def projects(deps):
+        return dict((getdepname(name) or name, name) for name, pinned in deps.values())
+    mine = projects(deps)
+    for other, otherdeps in groups:
+        if other != group:
+            continue
+        theirs = projects(otherdeps)
+        if all(theirs.get(project, name) == name for project, name in mine.items()):
+            otherdeps.update(deps)
+            return
+    groups.append((group, dict(deps)))
+
+
+class BackgroundCall(threading.Thread):
+    """ run ``func()`` in a daemon thread.  ``wait()`` blocks until the
+    call is done and returns its result or re-raises its exception.
+    ``callback()``, if given, is called from the thread once it's done. """
+
+    def __init__(self, func, callback=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.func = func
+        self.callback = callback
+        self.done = False
+        self._result = None
+        self._excinfo = None
+
+    def run(self):
+        try:
+            self._result = self.func()
+        except BaseException:
+            self._excinfo = sys.exc_info()
+        self.done = True
+        if self.callback is not None:
+            self.callback()
+
+    def wait(self):
+        while self.is_alive():
+            # wait with a timeout, python2 can't interrupt a plain join()
+            self.join(60)
+        if self._excinfo is not None:
+            py.builtin._reraise(*self._excinfo)
+        return self._result
+
+
 class Session:
     """ (unstable API).  the session object that ties
     together configuration, reporting, venv creation, testing. """
@@ -332,8 +483,21 @@ class Session:
         self.config = config
         self.popen = popen
         self.resultlog = ResultLog()
+        if config.option.resultjsonl and not config.parallel_env:
+            # parallel workers report to us through --result-json
+            self.resultlog.add_stream(
+                JsonLinesWriter(py.path.local(config.option.resultjsonl)))
+        if config.recordhistory and not config.parallel_env and \
+                config.option.history is None:
+            self.resultlog.add_stream(HistoryRecorder(config.historypath))
         self.report = Report(self)
-        self.make_emptydir(config.logdir)
+        self._deletions = []
+        self._tombstones = itertools.count()
+        if not config.parallel_env:
+            # the trash and the log directory belong to the process that
+            # spawned us, which may still be deleting tombstones
+            self._cleartrash()
+            self.make_emptydir(config.logdir)
         config.logdir.ensure(dir=1)
         # self.report.using("logdir %s" %(self.config.logdir,))
         self.report.using("tox.ini: %s" % (self.config.toxinipath,))
@@ -350,6 +514,14 @@ class Session:
             self.report.error(str(e))
             raise SystemExit(1)
         self._actions = []
+        self._packaging = None
+        self._localindex = None
+        self.wheelpath = None
+        option = config.option
+        if not (option.showconfig or option.listenvs or option.sdistonly or
+                option.history is not None):
+            config.interpreters.discover(
+                [venv.envconfig for venv in self.venvlist])
 
     @property
     def hook(self):
@@ -382,12 +554,19 @@ class Session:
 
     def runcommand(self):
         self.report.using("tox-%s from %s" % (tox.__version__, tox.__file__))
-        if self.config.option.showconfig:
-            self.showconfig()
-        elif self.config.option.listenvs:
-            self.showenvs()
-        else:
-            return self.subcommand_test()
+        try:
+            if self.config.option.showconfig:
+                self.showconfig()
+            elif self.config.option.listenvs:
+                self.showenvs()
+            elif self.config.option.history is not None:
+                self.showhistory()
+            else:
+                return self.subcommand_test()
+        finally:
+            self.wait_deletions()
+            for stream in self.resultlog.streams:
+                stream.close()
 
     def _copyfiles(self, srcdir, pathlist, destdir):
         for relpath in pathlist:
@@ -405,38 +584,218 @@ class Session:
             raise tox.exception.MissingFile(setup)
         action = self.newaction(None, "packaging")
         with action:
-            action.setactivity("sdist-make", setup)
-            self.make_emptydir(self.config.distdir)
-            action.popen([sys.executable, setup, "sdist", "--formats=zip",
-                          "--dist-dir", self.config.distdir, ],
-                         cwd=self.config.setupdir)
-            try:
-                return self.config.distdir.listdir()[0]
-            except py.error.ENOENT:
-                # check if empty or comment only
-                data = []
-                with open(str(setup)) as fp:
-                    for line in fp:
-                        if line and line[0] == '#':
-                            continue
-                        data.append(line)
-                if not ''.join(data).strip():
-                    self.report.error(
-                        'setup.py is empty'
-                    )
-                    raise SystemExit(1)
+            cachepath = self.config.toxworkdir.join(".sdist-cache")
+            cache = load_json(cachepath, {})
+            index = cache.get("files", {})
+            info = cache.get("sdist")
+            path = None
+            if info and info.get("sources") and not self.config.option.force_sdist:
+                fingerprint = self._sdist_fingerprint(info["sources"], index)
+                path = self._reusable_sdist(info, fingerprint)
+            if path is not None:
+                action.setactivity("sdist-reuse", path)
+                info["statkey"] = statkey(path)
+            else:
+                path = self._buildsdist(action, setup)
+                sources = self._sdist_sources(path)
+                fingerprint = sources and self._sdist_fingerprint(sources, index)
+                info = {"fingerprint": fingerprint,
+                        "sources": sources,
+                        "python": sys.executable,
+                        "basename": path.basename,
+                        "statkey": statkey(path),
+                        "sha256": file_digest(path)}
+            newcache = {"files": index, "sdist": info}
+            if self.config.wheel:
+                newcache["wheel"] = self._makewheel(action, setup, fingerprint,
+                                                    cache.get("wheel"))
+            dump_json(cachepath, newcache)
+            return path
+
+    def _buildsdist(self, action, setup):
+        action.setactivity("sdist-make", setup)
+        self.make_emptydir(self.config.distdir)
+        action.popen([sys.executable, setup, "sdist", "--formats=zip",
+                      "--dist-dir", self.config.distdir, ],
+                     cwd=self.config.setupdir)
+        try:
+            return self.config.distdir.listdir()[0]
+        except py.error.ENOENT:
+            # check if empty or comment only
+            data = []
+            with open(str(setup)) as fp:
+                for line in fp:
+                    if line and line[0] == '#':
+                        continue
+                    data.append(line)
+            if not ''.join(data).strip():
                 self.report.error(
-                    'No dist directory found. Please check setup.py, e.g with:\n'
-                    '     python setup.py sdist'
+                    'setup.py is empty'
                 )
                 raise SystemExit(1)
+            self.report.error(
+                'No dist directory found. Please check setup.py, e.g with:\n'
+                '     python setup.py sdist'
+            )
+            raise SystemExit(1)
+
+    def _makewheel(self, action, setup, fingerprint, info):
+        """ build a wheel of the project next to the sdist (or reuse the
+        one of the previous run) and return its cache record, or None if
+        no wheel could be built; environments then install the sdist. """
+        wheeldir = self.config.wheeldir
+        if info and fingerprint and not self.config.option.force_sdist and \
+                info.get("fingerprint") == fingerprint and \
+                info.get("python") == sys.executable and \
+                statkey(wheeldir.join(info["basename"])) == info["statkey"]:
+            self.wheelpath = wheeldir.join(info["basename"])
+            action.setactivity("wheel-reuse", self.wheelpath)
+            return info
+        action.setactivity("wheel-make", setup)
+        self.make_emptydir(wheeldir)
+        action.popen([sys.executable, setup, "bdist_wheel",
+                      "--dist-dir", wheeldir], cwd=self.config.setupdir,
+                     ignore_ret=True)
+        wheels = wheeldir.listdir("*.whl") if wheeldir.check() else []
+        if not wheels:
+            self.report.warning("could not build a wheel (is the 'wheel' package "
+                                "installed?), installing the sdist instead")
+            return None
+        self.wheelpath = wheels[0]
+        return {"fingerprint": fingerprint,
+                "python": sys.executable,
+                "basename": self.wheelpath.basename,
+                "statkey": statkey(self.wheelpath)}
+
+    def wheel_compatible(self, venv, wheelpath):
+        """ return True if the wheel can be installed into ``venv``.  Pure
+        python wheels need a matching python version tag, wheels with
+        compiled extensions the interpreter which built them. """
+        pytags, abi, platform = wheelpath.purebasename.split("-")[-3:]
+        info = venv.envconfig.python_info
+        if abi != "none" or platform != "any":
+            return info.executable is not None and \
+                py.path.local(info.executable).realpath() == \
+                py.path.local(sys.executable).realpath()
+        major, minor = info.version_info[:2]
+        return bool(set(pytags.split(".")) &
+                    set(["py%d" % major, "py%d%d" % (major, minor)]))
+
+    def installpkg_for(self, venv, path):
+        """ return the package to install into ``venv``: the wheel if one
+        was built and fits the environment's interpreter, else ``path``. """
+        if self.wheelpath is not None and self.wheel_compatible(venv, self.wheelpath):
+            return self.wheelpath
+        return path
+
+    def _sdist_sources(self, path):
+        """ return the files packed into the sdist ``path``, relative to
+        ``setupdir`` and without the metadata generated by setuptools, plus
+        the files which decide what goes into it.  Return None if the
+        archive can't be read, then the sdist is never reused. """
+        sources = set(["setup.py", "setup.cfg", "MANIFEST.in"])
+        try:
+            archive = zipfile.ZipFile(str(path))
+            try:
+                names = archive.namelist()
+            finally:
+                archive.close()
+        except (IOError, OSError, zipfile.BadZipfile):
+            return None
+        for name in names:
+            # members are below a "name-version" directory
+            parts = name.split("/")[1:]
+            if not parts or not parts[-1] or parts == ["PKG-INFO"] or \
+                    [part for part in parts if part.endswith(".egg-info")]:
+                continue
+            sources.add("/".join(parts))
+        return sorted(sources)
+
+    def _sdist_fingerprint(self, sources, index):
+        return sources_fingerprint(self.config.setupdir, sources, index,
+                                   ignore=self._sdist_ignore)
+
+    def _sdist_ignore(self, path):
+        """ return True for directory entries next to the sdist sources
+        which don't matter for it: hidden files such as version control
+        data and tool caches, build and coverage artifacts, virtualenvs
+        and the tox directories. """
+        name = path.basename
+        if name.startswith(".") or path.ext in (".pyc", ".pyo") or \
+                name.endswith(".egg-info") or \
+                name in ("__pycache__", "htmlcov", "node_modules"):
+            return True
+        if path.dirpath() == self.config.setupdir and name in ("build", "dist"):
+            return True
+        if path.join("pyvenv.cfg").check() or \
+                path.join("bin", "activate").check() or \
+                path.join("Scripts", "activate.bat").check():
+            return True
+        return path in (self.config.toxworkdir, self.config.distdir,
+                        self.config.distshare)
+
+    def _reusable_sdist(self, info, fingerprint):
+        """ return the sdist built by a previous run if the project sources
+        still have the given ``fingerprint``, otherwise None.  The archive
+        is taken from ``distdir`` or, if it was changed or removed there,
+        restored from ``distshare``. """
+        if not info or info.get("fingerprint") != fingerprint or \
+                info.get("python") != sys.executable:
+            return None
+        path = self.config.distdir.join(info["basename"])
+        if statkey(path) == info["statkey"]:
+            return path
+        shared = self.config.distshare.join(info["basename"])
+        if shared.check(file=1) and file_digest(shared) == info["sha256"]:
+            self.make_emptydir(self.config.distdir)
+            self.config.distdir.ensure(dir=1)
+            shared.copy(path)
+            return path
+        return None
 
     def make_emptydir(self, path):
         if path.check():
             self.report.info("  removing %s" % path)
-            py.std.shutil.rmtree(str(path), ignore_errors=True)
+            self._delete(path)
             path.ensure(dir=1)
 
+    @property
+    def _trashdir(self):
+        return self.config.toxworkdir.join(".trash")
+
+    def _delete(self, path):
+        """ move ``path`` into the trash directory and remove it from there
+        in the background, or right away if it can't be moved. """
+        self._trashdir.ensure(dir=1)
+        tombstone = self._trashdir.join("%s-%d-%d" % (
+            path.basename, os.getpid(), next(self._tombstones)))
+        try:
+            os.rename(str(path), str(tombstone))
+        except OSError:
+            # e.g. on another file system or a file in use on windows
+            py.std.shutil.rmtree(str(path), ignore_errors=True)
+            return
+        self._rmtree_background(tombstone)
+
+    def _rmtree_background(self, path):
+        deletion = BackgroundCall(
+            lambda: py.std.shutil.rmtree(str(path), ignore_errors=True))
+        deletion.start()
+        self._deletions.append(deletion)
+
+    def _cleartrash(self):
+        """ remove what crashed or interrupted runs left in the trash. """
+        try:
+            paths = self._trashdir.listdir()
+        except py.error.Error:
+            return
+        for path in paths:
+            self._rmtree_background(path)
+
+    def wait_deletions(self):
+        for deletion in self._deletions:
+            deletion.wait()
+
     def setupenv(self, venv):
         if not venv.matching_platform():
             venv.status = "platform mismatch"
@@ -456,7 +815,7 @@ class Session:
                 self.report.error(str(status))
                 return False
             commandpath = venv.getcommandpath("python")
-            envlog.set_python_info(commandpath)
+            envlog.set_python_info(commandpath, info=venv.envconfig.python_info)
             return True
 
     def finishvenv(self, venv):
@@ -466,6 +825,9 @@ class Session:
             return True
 
     def developpkg(self, venv, setupdir):
+        # "setup.py sdist" and the develop install both write the egg-info
+        # in setupdir, so they must not run at the same time
+        self.wait_installpkg_path()
         action = self.newaction(venv, "developpkg", setupdir)
         with action:
             try:
@@ -528,41 +890,356 @@ class Session:
         return path
 
     def subcommand_test(self):
+        self.startlocalindex()
+        try:
+            return self._subcommand_test()
+        finally:
+            self.stoplocalindex()
+
+    def _subcommand_test(self):
+        if self.config.option.sdistonly:
+            if self.config.skipsdist:
+                self.report.info("skipping sdist step")
+            elif not self.get_installpkg_path():
+                return 2
+            return
         if self.config.skipsdist:
             self.report.info("skipping sdist step")
-            path = None
+        if self.config.parallel:
+            if not self.runparallel():
+                return 2
         else:
-            path = self.get_installpkg_path()
-            if not path:
+            self.startpackaging()
+            self.buildwheelhouse()
+            pending = list(self.venvlist)
+            done = set()
+            while pending:
+                venv = self._popready(pending, done)
+                if not self.runvenv(venv):
+                    return 2
+                done.add(venv.name)
+            if not self.packaging_ok():
                 return 2
-        if self.config.option.sdistonly:
+        retcode = self._summary()
+        return retcode
+
+    def startlocalindex(self):
+        """ serve ``distshare``, ``distdir`` and the wheelhouse as the
+        ``local`` index server if ``localindex`` is enabled. """
+        if not self.config.localindex:
+            return
+        config = self.config
+        self._localindex = LocalIndex([config.distshare, config.distdir,
+                                       config.wheelhousedir])
+        self._localindex.start()
+        config.indexserver["local"].url = self._localindex.url
+        self.report.info("serving local index at %s" % self._localindex.url)
+
+    def stoplocalindex(self):
+        if self._localindex is not None:
+            self._localindex.stop()
+            self._localindex = None
+
+    def _wheelhouse_deps(self, venv):
+        """ return ``(key, indexurl, dep, pinned)`` tuples for the
+        dependencies of ``venv``; the key changes with the index and, for
+        files, with the contents of the dependency.  Only files and exact
+        ``==`` pins are ``pinned`` to one wheel. """
+        cachepath = self.config.digestcachepath
+        default = self.config.indexserver['default']
+        l = []
+        for dep in venv._getresolvedeps():
+            url = (dep.indexserver or default).url
+            md5 = getdigest(dep.name, cachepath)
+            pinned = md5 != "0" * 32 or bool(_rex_pinned.match(dep.name.strip()))
+            l.append(("%s %s %s" % (url or "", md5, dep.name), url, dep.name, pinned))
+        return l
+
+    def _wheelhouse_built(self, record, executable):
+        """ return the keys of the dependencies in the wheelhouse which
+        don't need to be built again for ``executable``. """
+        built = set(record.get(executable, []))
+        expires = now() - WHEELHOUSE_UNPINNED_TTL
+        unpinned = record.get("unpinned %s" % executable, {})
+        built.update(key for key, built_at in unpinned.items() if built_at > expires)
+        return built
+
+    def buildwheelhouse(self):
+        """ build wheels of the dependencies of all selected environments
+        into the wheelhouse, concurrently for different base interpreters.
+        Environments share a build unless they require different versions
+        of a project, so that a failing build only affects the environments
+        in it.  Dependencies already built by an earlier run are skipped;
+        ``wheelhouseopts`` tells which environments can then install their
+        dependencies from the wheelhouse alone. """
+        if not self.config.wheelhouse:
             return
+        record = load_json(self.config.wheelhouserecord, {})
+        groups = {}
         for venv in self.venvlist:
-            if self.setupenv(venv):
-                if venv.envconfig.usedevelop:
-                    self.developpkg(venv, self.config.setupdir)
-                elif self.config.skipsdist or venv.envconfig.skip_install:
-                    self.finishvenv(venv)
-                else:
-                    self.installpkg(venv, path)
+            executable = venv.envconfig.python_info.executable
+            if executable is None or not venv.matching_platform():
+                continue
+            built = self._wheelhouse_built(record, str(executable))
+            envdeps = {}
+            for key, url, name, pinned in self._wheelhouse_deps(venv):
+                if key not in built:
+                    group = (url, venv.envconfig.pip_pre)
+                    envdeps.setdefault(group, {})[key] = (name, pinned)
+            for group, deps in sorted(envdeps.items(), key=str):
+                _addwheelgroup(groups.setdefault(str(executable), []), group, deps)
+        if not groups:
+            return
 
-                # write out version dependency information
-                action = self.newaction(venv, "envreport")
+        def build(executable, groups):
+            keys = []
+            for (url, pre), deps in groups:
+                args = [executable, "-m", "pip", "wheel",
+                        "--wheel-dir", self.config.wheelhousedir,
+                        "--find-links", self.config.wheelhousedir]
+                if url:
+                    args += ["-i", url]
+                localurl = self._localindex and self._localindex.url
+                if localurl and localurl != url:
+                    args += ["--extra-index-url", localurl]
+                if pre:
+                    args.append("--pre")
+                names = sorted(set(name for name, pinned in deps.values()))
+                args += names
+                action = self.newaction(None, "wheelhouse", executable)
                 with action:
-                    args = venv.envconfig.list_dependencies_command
-                    output = venv._pcall(args,
-                                         cwd=self.config.toxinidir,
-                                         action=action)
-                    # the output contains a mime-header, skip it
-                    output = output.split("\n\n")[-1]
-                    packages = output.strip().split("\n")
+                    action.setactivity("wheelhouse", executable)
+                    try:
+                        action.popen(args, cwd=self.config.toxinidir)
+                    except tox.exception.InvocationError:
+                        self.report.warning(
+                            "could not build wheels of %s with %s, the environments "
+                            "needing them install their dependencies from the index"
+                            % (", ".join(names), executable))
+                        continue
+                keys.extend((key, pinned) for key, (name, pinned) in deps.items())
+            return keys
+
+        self.config.wheelhousedir.ensure(dir=1)
+        calls = {}
+        for executable in sorted(groups):
+            calls[executable] = BackgroundCall(
+                lambda executable=executable: build(executable, groups[executable]))
+            calls[executable].start()
+        for executable, call in calls.items():
+            built = set(record.get(executable, []))
+            unpinned = record.setdefault("unpinned %s" % executable, {})
+            for key, pinned in call.wait():
+                if pinned:
+                    built.add(key)
+                else:
+                    # resolved again once it expires, to pick up new releases
+                    unpinned[key] = now()
+            record[executable] = sorted(built)
+        dump_json(self.config.wheelhouserecord, record)
+
+    def wheelhouseopts(self, venv):
+        """ return the install options to use only the wheelhouse for the
+        dependencies of ``venv``, or None if they weren't all built. """
+        if not self.config.wheelhouse:
+            return None
+        executable = venv.envconfig.python_info.executable
+        record = load_json(self.config.wheelhouserecord, {})
+        built = self._wheelhouse_built(record, str(executable))
+        if executable is None or not built:
+            return None
+        for key, url, name, pinned in self._wheelhouse_deps(venv):
+            if key not in built:
+                return None
+        return ["--no-index", "--find-links", str(self.config.wheelhousedir)]
+
+    def startpackaging(self, callback=None):
+        """ build (or locate) the package under test in the background so
+        that it overlaps with creating the environments and installing
+        their dependencies.  Only installing the package waits for it. """
+        if not self.config.skipsdist:
+            self._packaging = BackgroundCall(self.get_installpkg_path,
+                                             callback=callback)
+            self._packaging.start()
+
+    def wait_installpkg_path(self):
+        """ return the path of the package under test, waiting for the
+        packaging started by ``startpackaging`` if needed.  Return None if
+        packaging failed or if there is no package (``skipsdist``). """
+        if self._packaging is not None:
+            return self._packaging.wait()
+
+    def packaging_ok(self):
+        return self.config.skipsdist or bool(self.wait_installpkg_path())
+
+    def _popready(self, pending, done, installpkg=True):
+        """ remove and return the first environment from ``pending`` whose
+        ``depends`` have all finished (successfully or not), or None.
+        Dependencies on environments which are not part of this run are
+        ignored; cycles were already rejected by the config parser.
+        If ``installpkg`` is false environments which wait for the package
+        under test are not considered. """
+        selected = set(venv.name for venv in self.venvlist)
+        for i, venv in enumerate(pending):
+            if not installpkg and self.waits_for_packaging(venv):
+                continue
+            depends = set(venv.envconfig.depends) & selected
+            depends.discard(venv.name)
+            if depends <= done:
+                return pending.pop(i)
+
+    def needs_installpkg(self, venv):
+        """ return True if the package under test gets installed from
+        the sdist (or --installpkg) into the given environment. """
+        return not (venv.envconfig.usedevelop or self.config.skipsdist
+                    or venv.envconfig.skip_install)
+
+    def waits_for_packaging(self, venv):
+        """ return True if setting up ``venv`` has to wait for the packaging
+        started by ``startpackaging``: it installs the package under test,
+        or its develop install writes the egg-info the sdist is built from. """
+        return self._packaging is not None and (
+            self.needs_installpkg(venv) or venv.envconfig.usedevelop)
+
+    def runvenv(self, venv):
+        """ setup the environment, install the package and run the tests.
+        Return False if the package under test could not be built. """
+        if self.setupenv(venv):
+            if venv.envconfig.usedevelop:
+                self.developpkg(venv, self.config.setupdir)
+            elif not self.needs_installpkg(venv):
+                self.finishvenv(venv)
+            else:
+                path = self.wait_installpkg_path()
+                if not path:
+                    return False
+                self.installpkg(venv, self.installpkg_for(venv, path))
+
+            # write out version dependency information
+            action = self.newaction(venv, "envreport")
+            with action:
+                if self.config.scaninstalled:
+                    packages = venv.scaninstalled()
+                    action.setactivity("installed", ",".join(
+                        "%s==%s" % package for package in packages))
+                else:
+                    packages = venv.listinstalled(action)
                     action.setactivity("installed", ",".join(packages))
-                    envlog = self.resultlog.get_envlog(venv.name)
-                    envlog.set_installed(packages)
+                envlog = self.resultlog.get_envlog(venv.name)
+                envlog.set_installed(packages)
+
+            self.runtestenv(venv)
+        return True
+
+    def runparallel(self):
+        """ run every test environment in its own "tox" worker process,
+        with at most ``config.parallel`` workers alive at the same time.
+        An environment is started as soon as all environments it
+        ``depends`` on have finished and, if it needs it, the package under
+        test is built.  Result logs and statuses of the workers are merged
+        back into this session so that ``_summary`` works just as for a
+        serial run.  Return False if the package could not be built. """
+        pending = list(self.venvlist)
+        running = {}
+        done = set()
+        finished = queue.Queue()
+        # a None item tells the loop below that packaging is done
+        self.startpackaging(callback=lambda: finished.put(None))
+        packaged = self._packaging is None
+        self.buildwheelhouse()
+        try:
+            while pending or running:
+                while pending and len(running) < self.config.parallel:
+                    venv = self._popready(pending, done, installpkg=packaged)
+                    if venv is None:
+                        break
+                    path = None
+                    if self.waits_for_packaging(venv):
+                        path = self.wait_installpkg_path()
+                        if not path:
+                            # don't start anything else, just wait for
+                            # the running workers to finish
+                            del pending[:]
+                            break
+                    running[venv.name] = self._startworker(venv, path, finished)
+                if not running and not pending:
+                    break
+                try:
+                    # wait with a timeout, python2 can't interrupt a plain get()
+                    venv = finished.get(True, 60)
+                except queue.Empty:
+                    continue
+                if venv is None:
+                    packaged = True
+                    continue
+                popen = running.pop(venv.name)
+                self._finishworker(venv, popen)
+                done.add(venv.name)
+        except KeyboardInterrupt:
+            self.report.keyboard_interrupt()
+            for popen in running.values():
+                popen.terminate()
+            raise
+        return self.packaging_ok()
 
-                self.runtestenv(venv)
-        retcode = self._summary()
-        return retcode
+    def _workerpath(self, venv, ext):
+        return self.config.logdir.join("parallel-%s.%s" % (venv.name, ext))
+
+    def _startworker(self, venv, path, finished):
+        args = [sys.executable, "-m", "tox"] + self.config.args
+        try:
+            pos = args.index("--")
+        except ValueError:
+            pos = len(args)
+        # later occurrences of an option win, so these override
+        # whatever the user passed on the command line
+        extra = ["--result-json", str(self._workerpath(venv, "json")),
+                 "--hashseed", self.config.hashseed or "noset"]
+        if self.needs_installpkg(venv):
+            extra += ["--installpkg", str(self.installpkg_for(venv, path))]
+        args[pos:pos] = extra
+        env = os.environ.copy()
+        env[PARALLEL_ENV_VAR] = venv.name
+        self.report.verbosity1("%s parallel: %s" % (venv.name, " ".join(args)))
+        fout = self._workerpath(venv, "log").open("w")
+        popen = subprocess.Popen(args, stdout=fout, stderr=STDOUT, env=env,
+                                 cwd=str(self.config.invocationcwd))
+        popen.starttime = now()
+
+        def wait():
+            try:
+                popen.wait()
+            finally:
+                fout.close()
+                finished.put(venv)
+        thread = threading.Thread(target=wait)
+        thread.daemon = True
+        thread.start()
+        return popen
+
+    def _finishworker(self, venv, popen):
+        logpath = self._workerpath(venv, "log")
+        duration = now() - popen.starttime
+        self.report.verbosity0("%s parallel: finished with exit code %d "
+                               "after %.2f seconds" % (venv.name, popen.returncode,
+                                                       duration),
+                               bold=True)
+        self.resultlog.emit("action", env=venv.name, msg="parallel", duration=duration)
+        self.report.line(logpath.read().rstrip())
+        jsonpath = self._workerpath(venv, "json")
+        try:
+            resultlog = ResultLog.loads_json(jsonpath.read())
+            envdata = resultlog.dict["testenvs"][venv.name]
+        except (py.error.Error, ValueError, KeyError):
+            venv.status = "parallel worker failed with exit code %d, see %s" % (
+                popen.returncode, logpath)
+            return
+        self.resultlog.dict.setdefault("testenvs", {})[venv.name] = envdata
+        self.resultlog.emit("testenv", env=venv.name, testenv=envdata)
+        if "installpkg" in resultlog.dict and "installpkg" not in self.resultlog.dict:
+            self.resultlog.dict["installpkg"] = resultlog.dict["installpkg"]
+            self.resultlog.emit("installpkg", installpkg=resultlog.dict["installpkg"])
+        venv.status = self.resultlog.get_envlog(venv.name).get_status()
 
     def runtestenv(self, venv, redirect=False):
         if not self.config.option.notest:
@@ -579,6 +1256,7 @@ class Session:
         retcode = 0
         for venv in self.venvlist:
             status = venv.status
+            self.resultlog.get_envlog(venv.name).set_status(status)
             if isinstance(status, tox.exception.InterpreterNotFound):
                 msg = "  %s: %s" % (venv.envconfig.envname, str(status))
                 if self.config.option.skip_missing_interpreters:
@@ -602,6 +1280,7 @@ class Session:
                 self.report.good("  %s: %s" % (venv.envconfig.envname, status))
         if not retcode:
             self.report.good("  congratulations :)")
+        self.resultlog.emit("finish", retcode=retcode)
 
         path = self.config.option.resultjson
         if path:
@@ -626,6 +1305,24 @@ class Session:
                 self.report.line("  %-15s = %s"
                                  % (attr.name, getattr(envconfig, attr.name)))
 
+    def showhistory(self):
+        path = self.config.historypath
+        runs, envs, commands = summarize(path, self.config.option.history)
+        if not runs:
+            self.report.line("no runs recorded in %s (see recordhistory)" % path)
+            return
+        self.report.keyvalue("history:", "last %d runs from %s" % (runs, path))
+        self.report.tw.line()
+        self.report.line("%-30s %10s %10s" % ("time spent per run", "p50", "p95"),
+                         bold=True)
+        for env, p50, p95 in envs:
+            self.report.line("%-30s %9.2fs %9.2fs" % (env, p50, p95))
+        self.report.tw.line()
+        self.report.line("slowest commands", bold=True)
+        for duration, env, command, retcode in commands:
+            self.report.line("%9.2fs %s: %s%s" % (
+                duration, env, command, retcode and " (exit code %d)" % retcode or ""))
+
     def showenvs(self):
         for env in self.config.envlist:
             self.report.line("%s" % env)
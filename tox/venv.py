@@ -3,9 +3,15 @@ import os
 import sys
 import re
 import codecs
+import hashlib
+import json
 import py
 import tox
 from .config import DepConfig, hookimpl
+from ._cache import clone_tree, dump_json, file_digest, load_json, statkey
+
+#: file in a venv template recording the environment it was copied from
+TEMPLATE_ORIGIN = ".tox-template-origin"
 
 
 class CreationConfig:
@@ -40,20 +46,22 @@ class CreationConfig:
             alwayscopy = bool(int(alwayscopy))
             deps = []
             for line in lines:
-                md5, depstring = line.split(None, 1)
-                deps.append((md5, depstring))
+                depmd5, depstring = line.split(None, 1)
+                deps.append((depmd5, depstring))
             return CreationConfig(md5, python, version, sitepackages, usedevelop, deps, alwayscopy)
         except Exception:
             return None
 
     def matches(self, other):
+        return self.matches_without_deps(other) and self.deps == other.deps
+
+    def matches_without_deps(self, other):
         return (other and self.md5 == other.md5
                 and self.python == other.python
                 and self.version == other.version
                 and self.sitepackages == other.sitepackages
                 and self.usedevelop == other.usedevelop
-                and self.alwayscopy == other.alwayscopy
-                and self.deps == other.deps)
+                and self.alwayscopy == other.alwayscopy)
 
 
 class VirtualEnv(object):
@@ -74,6 +82,23 @@ class VirtualEnv(object):
     def path_config(self):
         return self.path.join(".tox-config1")
 
+    @property
+    def path_installed(self):
+        return self.path.join(".tox-installed")
+
+    @property
+    def path_state(self):
+        """ json file recording what tox installed into the environment. """
+        return self.path.join(".tox-state")
+
+    def _getstate(self, name):
+        return load_json(self.path_state, {}).get(name)
+
+    def _setstate(self, name, value):
+        state = load_json(self.path_state, {})
+        state[name] = value
+        dump_json(self.path_state, state)
+
     @property
     def name(self):
         """ test environment name. """
@@ -153,14 +178,20 @@ class VirtualEnv(object):
             if status string is empty, all is ok.
         """
         rconfig = CreationConfig.readconfig(self.path_config)
-        if not self.envconfig.recreate and rconfig and \
-           rconfig.matches(self._getliveconfig()):
-            action.info("reusing", self.envconfig.envdir)
-            return
+        if not self.envconfig.recreate and rconfig:
+            liveconfig = self._getliveconfig()
+            if rconfig.matches(liveconfig):
+                action.info("reusing", self.envconfig.envdir)
+                return
+            if rconfig.matches_without_deps(liveconfig) and \
+                    not self.envconfig.config.lockdeps:
+                if self._canupdatedeps(rconfig.deps, liveconfig.deps):
+                    return self._updatedeps(action, rconfig.deps, liveconfig.deps)
         if rconfig is None:
             action.setactivity("create", self.envconfig.envdir)
         else:
             action.setactivity("recreate", self.envconfig.envdir)
+        self.cloned_template = False
         try:
             self.hook.tox_testenv_create(action=action, venv=self)
             self.just_created = True
@@ -177,7 +208,8 @@ class VirtualEnv(object):
 
     def _getliveconfig(self):
         python = self.envconfig.python_info.executable
-        md5 = getdigest(python)
+        cachepath = self.envconfig.config.digestcachepath
+        md5 = getdigest(python, cachepath)
         version = tox.__version__
         sitepackages = self.envconfig.sitepackages
         develop = self.envconfig.usedevelop
@@ -185,11 +217,44 @@ class VirtualEnv(object):
         deps = []
         for dep in self._getresolvedeps():
             raw_dep = dep.name
-            md5 = getdigest(raw_dep)
-            deps.append((md5, raw_dep))
+            deps.append((getdigest(raw_dep, cachepath), raw_dep))
         return CreationConfig(md5, python, version,
                               sitepackages, develop, deps, alwayscopy)
 
+    def _canupdatedeps(self, olddeps, newdeps):
+        """ return True if changing the dependencies from ``olddeps`` to
+        ``newdeps`` only needs installing the new and changed ones.  A
+        removed dependency needs the environment to be recreated: what it
+        pulled in can't be told apart from what the others still need. """
+        newnames = set(getdepname(dep) for md5, dep in newdeps)
+        for md5, dep in olddeps:
+            if (md5, dep) in newdeps:
+                continue
+            name = getdepname(dep)
+            if name is None or md5 != "0" * 32:
+                # a path, an option or a file whose contents changed
+                return False
+            if name not in newnames:
+                return False
+        return True
+
+    def _updatedeps(self, action, olddeps, newdeps):
+        """ bring the dependencies of the reused environment up to date by
+        installing just the ones which were added or changed. """
+        install = [dep for (md5, name), dep in zip(newdeps, self._getresolvedeps())
+                   if (md5, name) not in olddeps]
+        action.setactivity("updatedeps", ", ".join(map(str, install)))
+        try:
+            self._install(install, extraopts=self.session.wheelhouseopts(self),
+                          action=action)
+        except tox.exception.InvocationError:
+            # the environment is in an unknown state, recreate it next time
+            self.path_config.remove()
+            v = sys.exc_info()[1]
+            return "could not update deps %s; v = %r" % (
+                self.envconfig.deps, v)
+        self.finish()
+
     def _getresolvedeps(self):
         l = []
         for dep in self.envconfig.deps:
@@ -203,6 +268,130 @@ class VirtualEnv(object):
     def getsupportedinterpreter(self):
         return self.envconfig.getsupportedinterpreter()
 
+    def listinstalled(self, action):
+        """ return the lines of the ``list_dependencies_command`` output.
+
+        The output is kept in the environment until something is installed
+        into it or its site-packages directory changes. """
+        args = self.envconfig.list_dependencies_command
+        key = [args, statkey(self.envconfig.get_envsitepackagesdir())]
+        cache = load_json(self.path_installed, {})
+        if cache.get("key") == key:
+            return cache["installed"]
+        output = self._pcall(args, cwd=self.envconfig.config.toxinidir,
+                             action=action, returnout=True)
+        # the output contains a mime-header, skip it
+        output = output.split("\n\n")[-1]
+        packages = output.strip().split("\n")
+        try:
+            dump_json(self.path_installed, {"key": key, "installed": packages})
+        except EnvironmentError:
+            pass  # the cache is an optimization only
+        return packages
+
+    def scaninstalled(self):
+        """ return sorted ``(name, version)`` pairs of the distributions
+        installed into the environment's site-packages directory, read from
+        their metadata without starting a process. """
+        return scan_installed(self.envconfig.get_envsitepackagesdir())
+
+    def _installed_changed(self):
+        if self.path_installed.check():
+            self.path_installed.remove()
+
+    def _lockheader(self):
+        # identifies the deps a lock file was made for
+        deps = json.dumps(self._getliveconfig().deps)
+        return "# tox lock of deps %s" % hashlib.sha256(deps.encode("utf-8")).hexdigest()
+
+    def readlock(self):
+        """ return the requirements from the environment's lock file, or
+        None if there is none for the current deps or it gets refreshed. """
+        lockfile = self.envconfig.lockfile
+        if self.envconfig.config.option.relock or not lockfile.check():
+            return None
+        lines = lockfile.readlines(cr=0)
+        if not lines or lines[0] != self._lockheader():
+            return None
+        args = []
+        for line in lines[1:]:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            # a requirement is one argument, even "name @ url"; only an
+            # editable install is an option followed by its url
+            parts = line.split(None, 1)
+            if parts[0] in ("-e", "--editable"):
+                args.extend(parts)
+            else:
+                args.append(line)
+        return args
+
+    def writelock(self, action):
+        """ record the installed dependencies in the lock file. """
+        packages = [line for line in self.listinstalled(action) if line.strip()]
+        action.setactivity("lock", self.envconfig.lockfile)
+        self.envconfig.lockfile.write("\n".join([self._lockheader()] + packages) + "\n")
+
+    def _templatedir(self):
+        """ return the directory of the venv template matching this
+        environment's interpreter, creation options and dependencies. """
+        cconfig = self._getliveconfig()
+        indexserver = self.envconfig.config.indexserver['default']
+        deps = [(md5, dep.name, dep.indexserver and dep.indexserver.url)
+                for (md5, _), dep in zip(cconfig.deps, self._getresolvedeps())]
+        locked = self.readlock() if self.envconfig.config.lockdeps else None
+        data = json.dumps([cconfig.md5, str(cconfig.python), cconfig.version,
+                           cconfig.sitepackages, cconfig.alwayscopy, deps,
+                           indexserver.url, self.envconfig.pip_pre,
+                           self.envconfig.install_command, locked])
+        key = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        return self.envconfig.config.toxworkdir.join(".templates", key)
+
+    def _relocate(self, relpath):
+        # files which may contain the absolute path of the environment
+        bindir = self.envconfig.envbindir.relto(self.path)
+        return (relpath.startswith(bindir + os.sep)
+                or relpath.endswith((".pth", ".egg-link")))
+
+    def clonetemplate(self, action):
+        """ create the environment from a matching venv template and
+        return True, or return False if there is none. """
+        template = self._templatedir()
+        origin = template.join(TEMPLATE_ORIGIN)
+        if not origin.check():
+            return False
+        action.setactivity("clone", template)
+        self.session.make_emptydir(self.path)
+        clone_tree(template, self.path, origin=origin.read(),
+                   relocate=self._relocate,
+                   ignore=lambda relpath: relpath == TEMPLATE_ORIGIN)
+        self.cloned_template = True
+        return True
+
+    def savetemplate(self, action):
+        """ store the freshly set up environment as venv template for
+        environments with the same interpreter, options and dependencies. """
+        template = self._templatedir()
+        if template.check():
+            return
+        action.setactivity("save-template", template)
+        logdir = self.envconfig.envlogdir.relto(self.path)
+        ignore = (logdir, self.path_config.basename, self.path_installed.basename,
+                  self.path_state.basename)
+        tmp = template.new(basename="%s-%d.tmp" % (template.basename, os.getpid()))
+        try:
+            clone_tree(self.path, tmp, ignore=lambda relpath: (
+                relpath in ignore or relpath.endswith((".pyc", ".pyo"))
+                or os.path.basename(relpath) == "__pycache__"))
+            tmp.join(TEMPLATE_ORIGIN).write(str(self.path))
+            os.rename(str(tmp), str(template))
+        except EnvironmentError:
+            pass  # e.g. another tox process saved the template first
+        finally:
+            if tmp.check():
+                tmp.remove()
+
     def matching_platform(self):
         return re.match(self.envconfig.platform, sys.platform)
 
@@ -212,11 +401,7 @@ class VirtualEnv(object):
     def _needs_reinstall(self, setupdir, action):
         setup_py = setupdir.join('setup.py')
         setup_cfg = setupdir.join('setup.cfg')
-        args = [self.envconfig.envpython, str(setup_py), '--name']
-        env = self._getenv()
-        output = action.popen(args, cwd=setupdir, redirect=False,
-                              returnout=True, env=env)
-        name = output.strip()
+        name = self._getprojectname(setupdir, setup_py, setup_cfg, action)
         egg_info = setupdir.join('.'.join((name, 'egg-info')))
         for conf_file in (setup_py, setup_cfg):
             if (not egg_info.check()
@@ -224,6 +409,21 @@ class VirtualEnv(object):
                 return True
         return False
 
+    def _getprojectname(self, setupdir, setup_py, setup_cfg, action):
+        """ return the output of ``setup.py --name``, which is only run
+        again if the setup files changed since the last time. """
+        key = [str(setupdir), statkey(setup_py), statkey(setup_cfg)]
+        stamp = self._getstate("projectname")
+        if stamp is not None and stamp["key"] == key:
+            return stamp["name"]
+        args = [self.envconfig.envpython, str(setup_py), '--name']
+        env = self._getenv()
+        output = action.popen(args, cwd=setupdir, redirect=False,
+                              returnout=True, env=env)
+        name = output.strip()
+        self._setstate("projectname", {"key": key, "name": name})
+        return name
+
     def developpkg(self, setupdir, action):
         assert action is not None
         if getattr(self, 'just_created', False):
@@ -244,28 +444,50 @@ class VirtualEnv(object):
 
     def installpkg(self, sdistpath, action):
         assert action is not None
+        installed = None
+        if os.path.isfile(str(sdistpath)):
+            installed = {"sha256": file_digest(sdistpath),
+                         "extras": list(self.envconfig.extras)}
         if getattr(self, 'just_created', False):
             action.setactivity("inst", sdistpath)
             self.finish()
             extraopts = []
+        elif installed is not None and self._getstate("installpkg") == installed:
+            action.setactivity("inst-noop", sdistpath)
+            return
         else:
             action.setactivity("inst-nodeps", sdistpath)
             extraopts = ['-U', '--no-deps']
+            if str(sdistpath).endswith(".whl"):
+                # pip doesn't reinstall a wheel of an already installed version
+                extraopts.append('--force-reinstall')
 
         if action.venv.envconfig.extras:
             sdistpath += '[%s]' % ','.join(action.venv.envconfig.extras)
 
+        # forget the previous package until the new one is installed
+        self._setstate("installpkg", None)
         self._install([sdistpath], extraopts=extraopts, action=action)
+        if installed is not None:
+            self._setstate("installpkg", installed)
 
-    def _installopts(self, indexserver):
+    def _installopts(self, indexserver, extraindexservers=()):
         l = []
         if indexserver:
             l += ["-i", indexserver]
+        urls = list(extraindexservers)
+        config = self.envconfig.config
+        if config.localindex:
+            urls.append(config.indexserver["local"].url)
+        for url in urls:
+            if url and url != indexserver and url not in l:
+                l += ["--extra-index-url", url]
         if self.envconfig.pip_pre:
             l.append("--pre")
         return l
 
     def run_install_command(self, packages, action, options=()):
+        self._installed_changed()
         argv = self.envconfig.install_command[:]
         # use pip-script on win32 to avoid the executable locking
         i = argv.index('{packages}')
@@ -298,19 +520,35 @@ class VirtualEnv(object):
             return
         d = {}
         l = []
+        names = []
+        default = self.envconfig.config.indexserver['default']
         for dep in deps:
             if isinstance(dep, (str, py.path.local)):
                 dep = DepConfig(str(dep), None)
             assert isinstance(dep, DepConfig), dep
             if dep.indexserver is None:
-                ixserver = self.envconfig.config.indexserver['default']
+                ixserver = default
             else:
                 ixserver = dep.indexserver
             d.setdefault(ixserver, []).append(dep.name)
+            names.append(dep.name)
             if ixserver not in l:
                 l.append(ixserver)
             assert ixserver.url is None or isinstance(ixserver.url, str)
 
+        if self.envconfig.config.batchinstall and len(l) > 1:
+            # one pip run with the other index servers as extra indexes,
+            # unless one of those is pip's own default which can't be named
+            primary = default if default in l else l[0]
+            extra = [ixserver.url for ixserver in l if ixserver is not primary]
+            if None not in extra:
+                options = self._installopts(primary.url, extra)
+                if extraopts:
+                    options.extend(extraopts)
+                self.run_install_command(packages=names, options=options,
+                                         action=action)
+                return
+
         for ixserver in l:
             packages = d[ixserver]
             options = self._installopts(ixserver.url)
@@ -385,7 +623,7 @@ class VirtualEnv(object):
                     raise
 
     def _pcall(self, args, cwd, venv=True, testcommand=False,
-               action=None, redirect=True, ignore_ret=False):
+               action=None, redirect=True, ignore_ret=False, returnout=False):
         for name in ("VIRTUALENV_PYTHON", "PYTHONDONTWRITEBYTECODE"):
             os.environ.pop(name, None)
 
@@ -395,15 +633,102 @@ class VirtualEnv(object):
         bindir = str(self.envconfig.envbindir)
         env['PATH'] = p = os.pathsep.join([bindir, os.environ["PATH"]])
         self.session.report.verbosity2("setting PATH=%s" % p)
-        return action.popen(args, cwd=cwd, env=env,
-                            redirect=redirect, ignore_ret=ignore_ret)
-
-
-def getdigest(path):
+        return action.popen(args, cwd=cwd, env=env, redirect=redirect,
+                            ignore_ret=ignore_ret, returnout=returnout)
+
+
+#: distributions which ``pip freeze`` doesn't list either
+_FREEZE_EXCLUDED = ("pip", "setuptools", "distribute", "wheel")
+
+
+def scan_installed(sitepackagesdir):
+    """ return sorted ``(name, version)`` pairs of the distributions with
+    ``.dist-info`` or ``.egg-info`` metadata, or an ``.egg-link`` to a
+    development checkout, in ``sitepackagesdir``. """
+    installed = {}
+    try:
+        names = os.listdir(str(sitepackagesdir)) if sitepackagesdir else []
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(str(sitepackagesdir), name)
+        if name.endswith(".dist-info"):
+            metadata = os.path.join(path, "METADATA")
+        elif name.endswith(".egg-info"):
+            metadata = os.path.join(path, "PKG-INFO") if os.path.isdir(path) else path
+        elif name.endswith(".egg-link"):
+            metadata = _egglink_metadata(path)
+        else:
+            continue
+        info = _read_metadata(metadata) if metadata else None
+        if info is not None and info[0].lower() not in _FREEZE_EXCLUDED:
+            installed[info[0].lower()] = info
+    return sorted(installed.values(), key=lambda x: x[0].lower())
+
+
+def _egglink_metadata(path):
+    try:
+        with open(path) as f:
+            projectdir = f.readline().strip()
+        names = os.listdir(projectdir)
+    except (IOError, OSError):
+        return None
+    for name in names:
+        if name.endswith(".egg-info"):
+            return os.path.join(projectdir, name, "PKG-INFO")
+
+
+def _read_metadata(path):
+    # returns (name, version) from the headers of a METADATA/PKG-INFO file
+    info = {}
+    try:
+        with codecs.open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    break
+                key, _, value = line.partition(":")
+                if key in ("Name", "Version"):
+                    info[key] = value.strip()
+    except (IOError, OSError):
+        return None
+    if "Name" in info and "Version" in info:
+        return info["Name"], info["Version"]
+
+
+def getdepname(dep):
+    """ return the normalized project name of the requirement ``dep`` or
+    None if it isn't a plain requirement (e.g. a path or a pip option). """
+    m = re.match(r"^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*([<>=!~;].*)?$",
+                 dep.strip())
+    if m is None:
+        return None
+    return re.sub(r"[-_.]+", "-", m.group(1)).lower()
+
+
+def getdigest(path, cachepath=None):
+    """ return the md5 digest of the file at ``path``.
+
+    If ``cachepath`` is given, digests are remembered there keyed by the
+    file's path and stat information, so an unchanged file (typically a
+    several megabytes python binary) is not read again on the next run.
+    """
     path = py.path.local(path)
     if not path.check(file=1):
         return "0" * 32
-    return path.computehash()
+    if cachepath is None:
+        return path.computehash()
+    key = statkey(path)
+    digests = load_json(cachepath, {})
+    entry = digests.get(str(path))
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    digest = path.computehash()
+    digests[str(path)] = [key, digest]
+    try:
+        dump_json(cachepath, digests)
+    except EnvironmentError:
+        pass  # the cache is an optimization only
+    return digest
 
 
 @hookimpl
@@ -411,6 +736,8 @@ def tox_testenv_create(venv, action):
     # if self.getcommandpath("activate").dirpath().check():
     #    return
     config_interpreter = venv.getsupportedinterpreter()
+    if venv.envconfig.config.envtemplates and venv.clonetemplate(action):
+        return
     args = [sys.executable, '-m', 'virtualenv']
     if venv.envconfig.sitepackages:
         args.append('--system-site-packages')
@@ -433,8 +760,22 @@ def tox_testenv_create(venv, action):
 
 @hookimpl
 def tox_testenv_install_deps(venv, action):
+    if getattr(venv, 'cloned_template', False):
+        return  # the template has the dependencies installed already
     deps = venv._getresolvedeps()
-    if deps:
+    lockdeps = venv.envconfig.config.lockdeps
+    locked = venv.readlock() if lockdeps and deps else None
+    if locked is not None:
+        # install exactly the locked set, without resolving dependencies
+        action.setactivity("installdeps-locked", venv.envconfig.lockfile)
+        extraopts = ["--no-deps"] + (venv.session.wheelhouseopts(venv) or [])
+        venv._install(locked, extraopts=extraopts, action=action)
+    elif deps:
         depinfo = ", ".join(map(str, deps))
         action.setactivity("installdeps", "%s" % depinfo)
-        venv._install(deps, action=action)
+        venv._install(deps, extraopts=venv.session.wheelhouseopts(venv),
+                      action=action)
+        if lockdeps:
+            venv.writelock(action)
+    if venv.envconfig.config.envtemplates:
+        venv.savetemplate(action)